@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""
+Latency benchmark of the pre-receive hook over simulated pushes
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_scan import generate_history
+
+HOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prereceive.py')
+
+
+def percentile(samples, pct):
+    """
+    Nearest rank percentile of a list of samples
+    """
+    ordered = sorted(samples)
+
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+def simulate_pushes(path, pushes, size, seed=0):
+    """
+    Time the hook over `pushes` pushes of `size` commits each, returning latencies in milliseconds
+
+    Every push rewinds the branch to a random commit, leaving the commits after
+    it in the object store, and feeds the hook the update git would send.
+    """
+    rand = random.Random(seed)
+    commits = subprocess.check_output(['git', 'rev-list', '--reverse', 'HEAD'], cwd=path).decode('ascii').split()
+    latencies = []
+
+    for _ in range(pushes):
+        start = rand.randrange(len(commits) - size)
+        old, new = commits[start], commits[start + size]
+
+        subprocess.check_call(['git', 'update-ref', 'refs/heads/master', old], cwd=path)
+
+        began = time.perf_counter()
+        subprocess.run(
+            [sys.executable, HOOK], cwd=path, input='{} {} refs/heads/master\n'.format(old, new).encode('ascii'),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        latencies.append((time.perf_counter() - began) * 1000)
+
+    subprocess.check_call(['git', 'update-ref', 'refs/heads/master', commits[-1]], cwd=path)
+
+    return latencies
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Latency benchmark of the pre-receive hook')
+
+    parser.add_argument(
+        '--commits',
+        dest='commits',
+        type=int,
+        default=5000,
+        help='Number of commits in the repository pushed to'
+    )
+
+    parser.add_argument(
+        '--push-size',
+        dest='push_size',
+        type=int,
+        default=3,
+        help='Number of commits in each push'
+    )
+
+    parser.add_argument(
+        '--pushes',
+        dest='pushes',
+        type=int,
+        default=200,
+        help='Number of pushes to time'
+    )
+
+    parser.add_argument(
+        '--budget',
+        dest='budget',
+        type=float,
+        default=200,
+        help='Milliseconds the p99 latency must stay under, the benchmark fails otherwise'
+    )
+
+    parser.add_argument(
+        '--output',
+        dest='output',
+        help='File to write the results to as JSON'
+    )
+
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-prereceive-')
+
+    try:
+        generate_history(directory, commits=args.commits)
+        latencies = simulate_pushes(directory, args.pushes, args.push_size)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = {
+        "params": vars(args),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies),
+    }
+
+    for key in ('p50_ms', 'p90_ms', 'p99_ms', 'max_ms'):
+        print("{:<8} {:>8.1f}".format(key, results[key]))
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if results["p99_ms"] > args.budget:
+        print("p99 latency exceeds the {}ms budget".format(args.budget))
+        sys.exit(1)
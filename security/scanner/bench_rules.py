@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Micro-benchmark of secret detection throughput over diff text
+"""
+
+import argparse
+import random
+import string
+import time
+
+from entropy import EntropyDetector
+from rules import RuleSet
+
+LEGACY_PATTERN = (
+    r'(?:AWS)?_?(?:SECRET|ACCOUNT)?_?(?:ACCESS|ID)?_?(?:KEY)?(?:\s*)?(?::|=>|=)?(?:\s*)?(?:\"|\')?'
+    r'(?P<secret>AKIA[0-9A-Z]{16})(?:\"|\')?'
+)
+
+
+def diff_text(size, secret_every=5000, seed=0):
+    """
+    Generate roughly `size` bytes of unified diff text with an occasional planted secret
+    """
+    rand = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + ' _=(){}.,:"\''
+    lines = []
+    total = 0
+
+    while total < size:
+        if lines and len(lines) % secret_every == 0:
+            line = '+aws_access_key_id = "AKIA{}"'.format(''.join(rand.choice(string.ascii_uppercase) for _ in range(16)))
+        else:
+            line = rand.choice('+- ') + ''.join(rand.choice(alphabet) for _ in range(rand.randint(10, 100)))
+
+        lines.append(line)
+        total += len(line) + 1
+
+    return '\n'.join(lines)
+
+
+def measure(label, text, scan, repeat):
+    """
+    Time a scan function over the text, printing the best throughput in MB/s
+    """
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matches = scan(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print("{:<28} {:>10.1f} MB/s {:>8} matches".format(label, len(text) / best / 1024 / 1024, matches))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Secret detection throughput benchmark')
+
+    parser.add_argument(
+        '--size',
+        dest='size',
+        type=int,
+        default=16,
+        help='Megabytes of diff text to scan'
+    )
+
+    parser.add_argument(
+        '--repeat',
+        dest='repeat',
+        type=int,
+        default=3,
+        help='Number of timed runs, the fastest is reported'
+    )
+
+    args = parser.parse_args()
+
+    import re
+
+    text = diff_text(args.size * 1024 * 1024)
+    rules = RuleSet()
+    legacy = re.compile(LEGACY_PATTERN)
+
+    measure('legacy aws_regex', text, lambda t: len(legacy.findall(t)), args.repeat)
+    measure('rules, one regex per rule', text,
+            lambda t: sum(len(rule.regex.findall(t)) for rule in rules.rules), args.repeat)
+    measure('rules with prefilter', text, lambda t: sum(1 for _ in rules.finditer(t)), args.repeat)
+    measure('entropy', text, lambda t: sum(1 for _ in EntropyDetector().finditer(t)), args.repeat)
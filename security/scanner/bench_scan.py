@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+"""
+End to end scan benchmark over a generated git history
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import string
+import subprocess
+import tempfile
+import time
+
+from contextlib import contextmanager
+
+from entropy import EntropyDetector
+from scanner import GitHubScanner
+
+AUTHOR = 'Damian Myerscough <damian@example.com>'
+
+
+def _data(payload):
+    """
+    Encode a fast-import data command
+    """
+    return b'data ' + str(len(payload)).encode('ascii') + b'\n' + payload + b'\n'
+
+
+def _text(rand, size):
+    """
+    Generate roughly `size` bytes of source-like text
+    """
+    alphabet = string.ascii_letters + string.digits + ' _=(){}.,:"\''
+    lines = []
+    total = 0
+
+    while total < size:
+        line = ''.join(rand.choice(alphabet) for _ in range(rand.randint(10, 100)))
+        lines.append(line)
+        total += len(line) + 1
+
+    return lines
+
+
+def _secret(rand):
+    """
+    Generate a line assigning a random access key ID
+    """
+    return 'aws_access_key_id = "AKIA{}"'.format(''.join(rand.choice(string.ascii_uppercase) for _ in range(16)))
+
+
+def generate_history(path, commits=1000, files=50, file_size=4096, changes=3, binary_every=50, binary_size=65536,
+                     secret_every=25, seed=0):
+    """
+    Generate a repository with a synthetic linear history through `git fast-import`
+
+    Every commit rewrites a few lines in `changes` of `files` text files,
+    every `binary_every`th commit also adds a binary blob and every
+    `secret_every`th commit plants an access key ID. Returns the number of
+    planted secrets.
+    """
+    rand = random.Random(seed)
+    contents = {}
+    planted = 0
+
+    subprocess.check_call(['git', 'init', '-q', path])
+    proc = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=path, stdin=subprocess.PIPE)
+
+    for i in range(1, commits + 1):
+        changed = {}
+
+        for _ in range(changes if i > 1 else files):
+            name = 'src/module{}.py'.format(rand.randrange(files) if i > 1 else len(changed))
+            lines = contents.get(name) or _text(rand, file_size)
+
+            for _ in range(rand.randint(1, 5)):
+                lines[rand.randrange(len(lines))] = _text(rand, 60)[0]
+
+            contents[name] = changed[name] = lines
+
+        if secret_every and i % secret_every == 0:
+            name = rand.choice(list(changed))
+            changed[name].insert(rand.randrange(len(changed[name])), _secret(rand))
+            planted += 1
+
+        stream = [b'commit refs/heads/master\n']
+        stream.append('author {} {} +0000\n'.format(AUTHOR, 1500000000 + i * 60).encode('ascii'))
+        stream.append('committer {} {} +0000\n'.format(AUTHOR, 1500000000 + i * 60).encode('ascii'))
+        stream.append(_data('commit {}'.format(i).encode('ascii')))
+
+        for name, lines in sorted(changed.items()):
+            stream.append('M 100644 inline {}\n'.format(name).encode('ascii'))
+            stream.append(_data('\n'.join(lines).encode('ascii') + b'\n'))
+
+        if binary_every and i % binary_every == 0:
+            stream.append('M 100644 inline assets/image{}.png\n'.format(i).encode('ascii'))
+            stream.append(_data(b'\x89PNG\r\n\x1a\n\x00' + os.urandom(binary_size)))
+
+        proc.stdin.write(b''.join(stream) + b'\n')
+
+    proc.stdin.close()
+
+    if proc.wait() != 0:
+        raise RuntimeError("git fast-import failed")
+
+    subprocess.check_call(['git', 'checkout', '-q', 'master'], cwd=path)
+
+    return planted
+
+
+def _rss():
+    """
+    Peak resident set size of this process and of its waited-for children, in KiB
+    """
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+@contextmanager
+def stage(results, name):
+    """
+    Time a benchmark stage, recording its duration and the peak RSS so far
+    """
+    start = time.perf_counter()
+    record = {}
+
+    yield record
+
+    record["seconds"] = time.perf_counter() - start
+    record["peak_rss_kb"] = _rss()
+    results[name] = record
+
+
+def diff_bytes(path):
+    """
+    Size of the textual history that the scanner reads
+    """
+    output = subprocess.check_output(['git', 'log', '-p', '--no-color', '--no-ext-diff', 'HEAD'], cwd=path)
+
+    return len(output)
+
+
+def run(args, directory):
+    """
+    Generate a history and benchmark each scanning stage over it
+    """
+    stages = {}
+    origin = os.path.join(directory, 'origin')
+    clone = os.path.join(directory, 'clone')
+    repo_url = 'https://github.com/dmyerscough/bench.git'
+
+    with stage(stages, 'generate'):
+        planted = generate_history(
+            origin, commits=args.commits, files=args.files, file_size=args.file_size,
+            binary_every=args.binary_every, secret_every=args.secret_every, seed=args.seed
+        )
+
+    with stage(stages, 'clone') as record:
+        subprocess.check_call(['git', 'clone', '-q', '--no-local', origin, clone])
+        record["bytes"] = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(os.path.join(clone, '.git'))
+            for name in names
+        )
+
+    size = diff_bytes(clone)
+
+    scanner = GitHubScanner(entropy=EntropyDetector() if args.entropy else None)
+    scanner.local_repos[repo_url] = clone
+
+    with stage(stages, 'history') as record:
+        findings = scanner.inspect_commit(repo_url, workers=args.workers)
+        record["findings"] = sum(len(commit) for commit in findings.values())
+
+    stages['history']["commits_per_sec"] = args.commits / stages['history']["seconds"]
+    stages['history']["mb_per_sec"] = size / stages['history']["seconds"] / 1024 / 1024
+
+    with stage(stages, 'blobs') as record:
+        findings = scanner.inspect_blobs(repo_url)
+        record["findings"] = sum(len(commit) for commit in findings.values())
+
+    stages['blobs']["commits_per_sec"] = args.commits / stages['blobs']["seconds"]
+
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "python": platform.python_version(),
+        "git": subprocess.check_output(['git', '--version']).decode('ascii').strip(),
+        "params": vars(args),
+        "planted": planted,
+        "diff_bytes": size,
+        "stages": stages,
+        "peak_rss_kb": _rss(),
+    }
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='End to end scan benchmark over a generated git history')
+
+    parser.add_argument(
+        '--commits',
+        dest='commits',
+        type=int,
+        default=1000,
+        help='Number of commits to generate'
+    )
+
+    parser.add_argument(
+        '--files',
+        dest='files',
+        type=int,
+        default=50,
+        help='Number of text files in the tree'
+    )
+
+    parser.add_argument(
+        '--file-size',
+        dest='file_size',
+        type=int,
+        default=4096,
+        help='Bytes per text file'
+    )
+
+    parser.add_argument(
+        '--binary-every',
+        dest='binary_every',
+        type=int,
+        default=50,
+        help='Add a binary blob every N commits, 0 for none'
+    )
+
+    parser.add_argument(
+        '--secret-every',
+        dest='secret_every',
+        type=int,
+        default=25,
+        help='Plant an access key ID every N commits, 0 for none'
+    )
+
+    parser.add_argument(
+        '--seed',
+        dest='seed',
+        type=int,
+        default=0,
+        help='Random seed of the generated history'
+    )
+
+    parser.add_argument(
+        '--workers',
+        dest='workers',
+        type=int,
+        default=None,
+        help='Processes splitting the history scan between them'
+    )
+
+    parser.add_argument(
+        '-e',
+        '--entropy',
+        dest='entropy',
+        action='store_true',
+        help='Also run entropy detection'
+    )
+
+    parser.add_argument(
+        '--output',
+        dest='output',
+        default='bench_scan.json',
+        help='File to write the results to'
+    )
+
+    parser.add_argument(
+        '--keep',
+        dest='keep',
+        action='store_true',
+        help='Keep the generated repositories'
+    )
+
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-scan-')
+
+    try:
+        results = run(args, directory)
+    finally:
+        if args.keep:
+            print("Repositories kept in {}".format(directory))
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    with open(args.output, 'w') as fh:
+        json.dump(results, fh, indent=2)
+
+    for name, record in results["stages"].items():
+        print("{:<10} {:>8.2f}s {}".format(name, record["seconds"], ', '.join(
+            '{}={}'.format(key, round(value, 1) if isinstance(value, float) else value)
+            for key, value in sorted(record.items()) if key not in ('seconds', 'peak_rss_kb')
+        )))
+
+    print("Results written to {}".format(args.output))
@@ -0,0 +1,177 @@
+"""
+Content addressed access to git blobs
+"""
+
+import subprocess
+
+from collections import OrderedDict
+
+# Git treats any object with a NUL byte in its first 8000 bytes as binary
+BINARY_SNIFF_BYTES = 8000
+
+# Missing blobs requested from a partial clone's promisor remote per fetch
+FETCH_BATCH_SIZE = 1000
+
+# Bytes of an object beyond the size read that are discarded at a time
+DISCARD_BLOCK_SIZE = 1024 * 1024
+
+
+def is_binary(data):
+    """
+    Determine whether an object's content is binary using git's heuristic
+    """
+    return b'\x00' in data[:BINARY_SNIFF_BYTES]
+
+
+def is_partial_clone(repo_path, remote='origin', git='git'):
+    """
+    Determine whether a repository was cloned with a filter and fetches missing objects from `remote`
+    """
+    proc = subprocess.Popen(
+        [git, 'config', '--get', 'remote.{}.promisor'.format(remote)], cwd=repo_path, stdout=subprocess.PIPE
+    )
+    output, _ = proc.communicate()
+
+    return output.strip() == b'true'
+
+
+def fetch_blobs(repo_path, shas, remote='origin', batch_size=FETCH_BATCH_SIZE, git='git'):
+    """
+    Fetch missing blobs into a partial clone in batches, returning the number requested
+
+    Without this git fetches every missing blob it needs in a separate round
+    trip. The fetch mirrors the one git itself uses for lazy fetches.
+    """
+    cmd = [
+        git, '-c', 'fetch.negotiationAlgorithm=noop', 'fetch', remote, '--quiet', '--no-tags',
+        '--no-write-fetch-head', '--recurse-submodules=no', '--filter=blob:none', '--stdin'
+    ]
+    batch = []
+    fetched = 0
+
+    for sha in shas:
+        batch.append(sha)
+
+        if len(batch) == batch_size:
+            fetched += _fetch(cmd, repo_path, batch)
+            batch = []
+
+    if batch:
+        fetched += _fetch(cmd, repo_path, batch)
+
+    return fetched
+
+
+def _fetch(cmd, repo_path, shas):
+    """
+    Request a single batch of objects
+    """
+    subprocess.run(cmd, cwd=repo_path, input='\n'.join(shas).encode('ascii') + b'\n', check=True)
+
+    return len(shas)
+
+
+class CatFileBatch(object):
+    """
+    Read objects through a single persistent `git cat-file --batch` process
+    """
+
+    def __init__(self, repo_path, git='git'):
+        self.proc = subprocess.Popen(
+            [git, 'cat-file', '--batch'], cwd=repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, sha):
+        """
+        Read an object, returning its type and content or (None, None) if it does not exist
+        """
+        objtype, data, _ = self.read_prefix(sha)
+
+        return objtype, data
+
+    def read_prefix(self, sha, max_size=None):
+        """
+        Read at most `max_size` bytes of an object, returning its type, content and full size
+
+        The rest of a larger object is read and discarded a block at a time,
+        so it is never held in memory. Returns (None, None, 0) if the object
+        does not exist.
+        """
+        self.proc.stdin.write(sha.encode('ascii') + b'\n')
+        self.proc.stdin.flush()
+
+        header = self.proc.stdout.readline().decode('ascii').split()
+
+        if len(header) != 3:
+            return None, None, 0
+
+        _, objtype, size = header
+        size = int(size)
+
+        data = self.proc.stdout.read(size if max_size is None else min(size, max_size))
+        remaining = size - len(data)
+
+        while remaining > 0:
+            block = self.proc.stdout.read(min(remaining, DISCARD_BLOCK_SIZE))
+
+            if not block:
+                break
+
+            remaining -= len(block)
+
+        self.proc.stdout.read(1)  # Each object is terminated by a newline
+
+        return objtype, data, size
+
+    def close(self):
+        """
+        Shut down the cat-file process
+        """
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+        self.proc.stdout.close()
+
+
+class BlobCache(object):
+    """
+    Bounded LRU cache of scan results keyed by blob sha
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._blobs = OrderedDict()
+
+    def __contains__(self, sha):
+        return sha in self._blobs
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def get(self, sha, default=None):
+        """
+        Get a blob's scan result, marking it as recently used
+        """
+        if sha not in self._blobs:
+            return default
+
+        self._blobs.move_to_end(sha)
+
+        return self._blobs[sha]
+
+    def put(self, sha, result):
+        """
+        Store a blob's scan result, evicting the least recently used blobs when full
+        """
+        self._blobs[sha] = result
+        self._blobs.move_to_end(sha)
+
+        while len(self._blobs) > self.maxsize:
+            self._blobs.popitem(last=False)
@@ -0,0 +1,140 @@
+"""
+Connection pooled GitHub API client
+"""
+
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ratelimit import RateLimiter
+
+# Headers replayed from the cache when a conditional request is answered with a 304
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Link')
+
+
+def _opaque_tag(etag):
+    """
+    Strip the weak validator prefix and quotes from an ETag
+    """
+    if etag.startswith('W/'):
+        etag = etag[2:]
+
+    return etag.strip('"')
+
+
+class GitHubClient(object):
+    """
+    GitHub API client reusing keep-alive connections across requests
+
+    Every request shares one `requests.Session`, so only the first request to
+    a host pays for the TCP and TLS handshake. Connection errors and 5xx
+    responses are retried with exponential backoff, and requests wait on the
+    rate limiter only once GitHub's budget is exhausted.
+
+    Given a `ResponseCache`, every request is made conditional on the cached
+    ETag and a 304 Not Modified is answered with the cached body, which GitHub
+    does not count against the rate limit.
+
+    Given a `Metrics`, the number and duration of requests and the number
+    answered from the cache are recorded.
+    """
+
+    def __init__(self, token=None, timeout=(3.05, 30), retries=3, backoff=0.5, pool_size=10, ratelimit=None,
+                 cache=None, metrics=None):
+        self.timeout = timeout
+        self.ratelimit = ratelimit or RateLimiter()
+        self.cache = cache
+        self.metrics = metrics
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=(500, 502, 503, 504),
+                raise_on_status=False,
+            ),
+        )
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.session.headers['Accept'] = 'application/vnd.github.v3+json'
+
+        if token is not None:
+            self.session.headers['Authorization'] = 'token {}'.format(token)
+
+    def get(self, url, headers=None):
+        """
+        Issue a GET request over a pooled connection
+
+        Requests rejected because the rate limit ran out are retried once the
+        window resets. Responses served from the cache have `from_cache` set.
+        """
+        headers = dict(headers or {})
+        cached = self.cache.get(url) if self.cache is not None else None
+
+        if cached is not None and not headers.get('If-None-Match'):
+            headers['If-None-Match'] = cached.etag
+
+        while True:
+            self.ratelimit.acquire()
+
+            start = time.perf_counter()
+            resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            self.ratelimit.update(resp.headers)
+
+            if self.metrics is not None:
+                self.metrics.increment('api_requests')
+                self.metrics.observe('api_request', time.perf_counter() - start)
+
+            if resp.status_code in (403, 429) and self.ratelimit.exhausted():
+                continue
+
+            break
+
+        resp.from_cache = False
+
+        if resp.status_code == 304:
+            self.ratelimit.refund()
+
+            # Only the cached body matches the validator it was revalidated with
+            if cached is not None and _opaque_tag(headers['If-None-Match']) == _opaque_tag(cached.etag):
+                if self.metrics is not None:
+                    self.metrics.increment('api_cache_hits')
+
+                return self._replay(resp, cached)
+        elif resp.status_code == 200 and self.cache is not None and resp.headers.get('ETag'):
+            self.cache.put(
+                url,
+                resp.headers['ETag'],
+                {name: resp.headers[name] for name in CACHED_HEADERS if name in resp.headers},
+                resp.content
+            )
+
+        return resp
+
+    @staticmethod
+    def _replay(resp, cached):
+        """
+        Turn a 304 Not Modified into the cached 200 response it revalidated
+        """
+        resp.status_code = 200
+        resp.reason = 'OK'
+        resp._content = cached.body
+        resp.headers.update(cached.headers)
+        resp.from_cache = True
+
+        return resp
+
+    def close(self):
+        """
+        Close every pooled connection
+        """
+        self.session.close()
+
@@ -0,0 +1,396 @@
+"""
+Long running scanner fed by GitHub push webhooks and the events API
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from history import has_commit, is_null_sha, list_refs
+
+logger = logging.getLogger(__name__)
+
+# Largest webhook payload accepted, GitHub caps deliveries at 25MB
+MAX_PAYLOAD_SIZE = 25 * 1024 * 1024
+
+# Seconds between events API polls, raised when GitHub asks for a longer X-Poll-Interval
+POLL_INTERVAL = 60
+
+# Seconds a webhook sender has to deliver its whole request before the connection is dropped
+READ_TIMEOUT = 30
+
+# Host pushed repositories must be cloned from, so a webhook cannot point the daemon at any URL
+CLONE_HOST = 'github.com'
+
+
+def signature(secret, body):
+    """
+    Compute the `X-Hub-Signature-256` header GitHub sends with a webhook body
+    """
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def is_loopback(host):
+    """
+    Determine whether a listening address only accepts connections from the local machine
+    """
+    if host == 'localhost':
+        return True
+
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def range_revisions(repo_path, updates, known_tips=()):
+    """
+    Revisions walking the commits pushed by a list of (before, after, ref) updates
+
+    Updates are coalesced into a single walk of every new tip, excluding
+    every old tip that still exists. `known_tips` are the commits every ref
+    pointed at before the push was fetched, so a new branch, which has no old
+    tip, only walks commits the repository did not already have. Returns an
+    empty list when the updates only delete refs.
+    """
+    tips = sorted(set(after for _, after, _ in updates if not is_null_sha(after)))
+
+    if not tips:
+        return []
+
+    known = sorted(set(
+        before for before in [before for before, _, _ in updates] + list(known_tips)
+        if not is_null_sha(before) and has_commit(repo_path, before)
+    ))
+
+    return tips + ['^{}'.format(before) for before in known if before not in tips]
+
+
+class PushQueue(object):
+    """
+    Bounded queue of repositories waiting to be scanned, coalescing pushes to the same repository
+
+    A push to a repository already waiting in the queue is merged into the
+    waiting entry, so a burst of pushes becomes a single scan and never takes
+    up more than one slot. New repositories are refused once `maxsize` are
+    waiting, which is how back-pressure reaches webhook senders and pollers.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.pending = {}
+        self.ready = asyncio.Queue()
+        self.space = asyncio.Event()
+
+    def offer(self, repo_url, updates):
+        """
+        Queue a repository's ref updates without waiting, returning False if the queue is full
+        """
+        if repo_url in self.pending:
+            self.pending[repo_url].extend(updates)
+            return True
+
+        if len(self.pending) >= self.maxsize:
+            return False
+
+        self.pending[repo_url] = list(updates)
+        self.ready.put_nowait(repo_url)
+
+        return True
+
+    async def put(self, repo_url, updates):
+        """
+        Queue a repository's ref updates, waiting for room if the queue is full
+        """
+        while not self.offer(repo_url, updates):
+            self.space.clear()
+            await self.space.wait()
+
+    async def get(self):
+        """
+        Take the next repository to scan along with every update coalesced for it
+        """
+        repo_url = await self.ready.get()
+        self.space.set()
+
+        return repo_url, self.pending.pop(repo_url)
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class ScanDaemon(object):
+    """
+    Scan repositories as soon as they are pushed to
+
+    Push events arrive as webhook deliveries on a local HTTP endpoint, or
+    from polling the events API with ETags, and are put on a `PushQueue`.
+    Scans run one at a time on a dedicated thread, which uses the scanner's
+    state database opened on the main thread, and pushes arriving during a
+    scan coalesce in the queue. With a mirror cache each scan only fetches
+    what was pushed, and with scan state only commits after the last recorded
+    tips are scanned. A mirror cache is required, as otherwise every push
+    would clone the whole repository again.
+
+    Only repositories on `clone_host` are scanned, and without a `secret`
+    webhooks are only accepted on a loopback address, so nobody else can make
+    the daemon clone a URL of their choosing.
+    """
+
+    def __init__(self, scanner, queue_size=100, secret=None, poll_interval=POLL_INTERVAL, clone_host=CLONE_HOST,
+                 read_timeout=READ_TIMEOUT):
+        if scanner.mirrors is None:
+            raise ValueError("Scanning pushes requires a scanner with a mirror cache")
+
+        self.scanner = scanner
+        self.queue_size = queue_size
+        self.secret = secret
+        self.poll_interval = poll_interval
+        self.clone_host = clone_host
+        self.read_timeout = read_timeout
+
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.scanned = 0
+
+    def scan(self, repo_url, updates):
+        """
+        Scan the commits pushed to a repository, run on the scanning thread
+        """
+        scanner = self.scanner
+        # The mirror's refs before fetching the push were all scanned already
+        known_tips = self._mirror_tips(repo_url) if scanner.state is None else ()
+
+        if not scanner.clone_user_repo(repo_url):
+            return {}
+
+        try:
+            if scanner.state is not None:
+                return scanner.scan_repo(repo_url, check_etag=False)
+
+            revisions = range_revisions(scanner.local_repos[repo_url], updates, known_tips)
+
+            return scanner.inspect_commit(repo_url, revisions=revisions) if revisions else {}
+        finally:
+            scanner.cleanup_repo(repo_url)
+
+    def _mirror_tips(self, repo_url):
+        """
+        Commits the refs of a repository's mirror point at, empty when it has not been mirrored yet
+        """
+        path = self.scanner.mirrors.path(repo_url)
+
+        if not os.path.isdir(path):
+            return []
+
+        try:
+            return sorted(set(list_refs(path).values()))
+        except subprocess.CalledProcessError as err:
+            logger.info("Unable to list the refs of {}: {}".format(repo_url, err.stderr))
+            return []
+
+    async def work(self):
+        """
+        Scan queued repositories until cancelled
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            repo_url, updates = await self.queue.get()
+            logger.info("Scanning {} after {} pushes".format(repo_url, len(updates)))
+
+            try:
+                # Findings go straight to the scanner's sink, so count them from its metrics
+                found = self._findings()
+                await loop.run_in_executor(self.executor, self.scan, repo_url, updates)
+                logger.info("Found {} secrets in {}".format(self._findings() - found, repo_url))
+            except Exception as err:
+                logger.info("Unable to scan {}: {}".format(repo_url, err))
+
+            self.scanned += 1
+
+    def _findings(self):
+        """
+        Number of findings the scanner has reported so far
+        """
+        return self.scanner.metrics.snapshot()['counters'].get('findings', 0)
+
+    def deliver(self, event, body, signature_header=None):
+        """
+        Handle a webhook delivery, returning the HTTP status to answer with
+        """
+        if self.secret is not None and not hmac.compare_digest(
+                signature(self.secret, body), signature_header or ''):
+            return HTTPStatus.UNAUTHORIZED
+
+        if event == 'ping':
+            return HTTPStatus.OK
+        elif event != 'push':
+            return HTTPStatus.NO_CONTENT
+
+        try:
+            payload = json.loads(body.decode('utf-8'))
+            repo_url = payload['repository']['clone_url']
+            update = (payload['before'], payload['after'], payload['ref'])
+        except (ValueError, KeyError, TypeError):
+            return HTTPStatus.BAD_REQUEST
+
+        clone_url = urlsplit(repo_url) if isinstance(repo_url, str) else None
+
+        if clone_url is None or clone_url.scheme != 'https' or clone_url.hostname != self.clone_host:
+            logger.info("Refusing push to {!r}, not a repository on {}".format(repo_url, self.clone_host))
+            return HTTPStatus.FORBIDDEN
+
+        if is_null_sha(update[1]):
+            return HTTPStatus.NO_CONTENT
+
+        if not self.queue.offer(repo_url, [update]):
+            logger.info("Queue is full, refusing push to {}".format(repo_url))
+            return HTTPStatus.SERVICE_UNAVAILABLE
+
+        return HTTPStatus.ACCEPTED
+
+    async def handle(self, reader, writer):
+        """
+        Serve a single HTTP request on the webhook endpoint, dropping senders that take too long to send it
+        """
+        try:
+            status = await asyncio.wait_for(self._respond(reader), self.read_timeout)
+        except asyncio.TimeoutError:
+            status = HTTPStatus.REQUEST_TIMEOUT
+
+        retry = 'Retry-After: {}\r\n'.format(self.poll_interval) if status == HTTPStatus.SERVICE_UNAVAILABLE else ''
+        writer.write('HTTP/1.1 {} {}\r\nContent-Length: 0\r\nConnection: close\r\n{}\r\n'.format(
+            status.value, status.phrase, retry
+        ).encode('latin-1'))
+
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _respond(self, reader):
+        """
+        Read a request from the webhook endpoint, returning the HTTP status to answer with
+        """
+        try:
+            method, _, _ = (await reader.readline()).decode('latin-1').partition(' ')
+            headers = {}
+
+            while True:
+                line = await reader.readline()
+
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+
+            if method != 'POST':
+                status = HTTPStatus.METHOD_NOT_ALLOWED
+            elif length > MAX_PAYLOAD_SIZE:
+                status = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+            else:
+                status = self.deliver(
+                    headers.get('x-github-event'), await reader.readexactly(length),
+                    headers.get('x-hub-signature-256')
+                )
+        except (ValueError, asyncio.IncompleteReadError):
+            status = HTTPStatus.BAD_REQUEST
+
+        return status
+
+    async def poll(self, url):
+        """
+        Poll an events API URL for push events until cancelled
+
+        Each poll is conditional on the previous response's ETag, so polls
+        that find nothing new don't count against the rate limit, and events
+        already seen are skipped by their increasing ids.
+        """
+        loop = asyncio.get_running_loop()
+        etag = ''
+        last_id = None
+
+        while True:
+            interval = self.poll_interval
+
+            try:
+                resp = await loop.run_in_executor(None, partial(
+                    self.scanner.client.get, url, headers={'If-None-Match': etag}
+                ))
+                interval = max(interval, int(resp.headers.get('X-Poll-Interval', 0)))
+
+                if resp.status_code == 200:
+                    etag = resp.headers.get('ETag', '')
+                    events = sorted(resp.json(), key=lambda event: int(event['id']))
+
+                    for event in events:
+                        if last_id is not None and int(event['id']) <= last_id:
+                            continue
+
+                        if event.get('type') == 'PushEvent' and not is_null_sha(event['payload'].get('head')):
+                            await self.queue.put(
+                                'https://github.com/{}.git'.format(event['repo']['name']),
+                                [(event['payload'].get('before'), event['payload']['head'], event['payload']['ref'])]
+                            )
+
+                    if events:
+                        last_id = int(events[-1]['id'])
+                elif resp.status_code != 304:
+                    logger.info("Unable to poll {}: {}".format(url, resp.reason))
+            except Exception as err:
+                logger.info("Unable to poll {}: {}".format(url, err))
+
+            await asyncio.sleep(interval)
+
+    async def start(self, host='127.0.0.1', port=8080, polls=()):
+        """
+        Start the webhook endpoint, pollers and scanning worker, returning the server and tasks
+
+        Raises ValueError when asked to accept unsigned webhooks from other machines.
+        """
+        if port is not None and self.secret is None and not is_loopback(host):
+            raise ValueError("Webhooks on {} must be signed, set a webhook secret".format(host))
+
+        self.queue = PushQueue(self.queue_size)
+        tasks = [asyncio.ensure_future(self.work())]
+        tasks.extend(asyncio.ensure_future(self.poll(url)) for url in polls)
+
+        server = await asyncio.start_server(self.handle, host, port) if port is not None else None
+
+        return server, tasks
+
+    async def run(self, host='127.0.0.1', port=8080, polls=()):
+        """
+        Run the daemon until cancelled
+        """
+        server, tasks = await self.start(host, port, polls)
+
+        if server is not None:
+            logger.info("Listening for webhooks on {}".format(
+                ', '.join('{}:{}'.format(*sock.getsockname()[:2]) for sock in server.sockets)
+            ))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            if server is not None:
+                server.close()
+
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,151 @@
+"""
+Vectorized Shannon entropy scoring for high-entropy secret candidates
+"""
+
+import re
+
+import numpy as np
+
+from rules import Match
+
+BASE64_CHARS = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+HEX_CHARS = b'0123456789abcdefABCDEF'
+
+# Lengths of SHA-1 and SHA-256 object ids, which fill diffs of lockfiles, submodules and changelogs
+OBJECT_ID_LENGTHS = (40, 64)
+OBJECT_ID_REGEX = re.compile('[0-9a-f]+')
+
+
+def _charset(chars):
+    """
+    Build byte lookup tables marking the members of a character set and numbering them
+    """
+    members = np.zeros(256, dtype=bool)
+    members[np.frombuffer(chars, dtype=np.uint8)] = True
+
+    symbols = np.zeros(256, dtype=np.int64)
+    symbols[np.frombuffer(chars, dtype=np.uint8)] = np.arange(len(chars))
+
+    return members, symbols, len(chars)
+
+
+class EntropyDetector(object):
+    """
+    Find runs of base64 or hex characters whose Shannon entropy is suspiciously high
+
+    AWS secret access keys have no fixed prefix, so rather than a regex each
+    run of at least `min_length` base64 or hex characters is scored. Runs
+    longer than `window` are scored over sliding windows so a key embedded in
+    a longer token is still found, and only the highest scoring window is
+    reported, never the whole run. All runs and windows in a piece of text
+    are scored together with NumPy rather than character by character.
+
+    Random hex can't be told apart from a git object id by its entropy, so
+    hex runs shaped exactly like a lowercase SHA-1 or SHA-256 are skipped.
+    """
+
+    def __init__(self, base64_threshold=4.5, hex_threshold=3.0, min_length=20, window=40):
+        self.thresholds = [
+            ('high-entropy-base64', _charset(BASE64_CHARS), base64_threshold, False),
+            ('high-entropy-hex', _charset(HEX_CHARS), hex_threshold, True),
+        ]
+        self.min_length = min_length
+        self.window = window
+        self.stride = max(1, window // 2)
+
+        # Every count within a window is at most `window`, so c * log2(c) is a table lookup
+        counts = np.arange(window + 1, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.plogp = np.where(counts > 0, counts * np.log2(counts), 0.0)
+
+    def _runs(self, mask):
+        """
+        Find the start and end of every run of at least `min_length` set positions
+        """
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+        starts, ends = edges[::2], edges[1::2]
+        keep = ends - starts >= self.min_length
+
+        return starts[keep], ends[keep]
+
+    def _windows(self, starts, ends):
+        """
+        Split each run into windows, returning each window's run index, start and length
+        """
+        lengths = ends - starts
+        counts = np.where(lengths > self.window, -(-(lengths - self.window) // self.stride) + 1, 1)
+
+        run = np.repeat(np.arange(len(starts)), counts)
+        step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        window_starts = np.minimum(starts[run] + step * self.stride, ends[run] - np.minimum(lengths[run], self.window))
+        window_lengths = np.minimum(lengths[run], self.window)
+
+        return run, window_starts, window_lengths
+
+    def _entropy(self, data, symbols, size, starts, lengths):
+        """
+        Compute the Shannon entropy of many slices of a byte array at once
+
+        Bytes are numbered 0 to `size` - 1 through the `symbols` table.
+        For a slice of length n with symbol counts c the entropy is
+        log2(n) - sum(c * log2(c)) / n.
+        """
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        counts = np.bincount(
+            segment * size + symbols[data[np.repeat(starts, lengths) + offsets]], minlength=len(starts) * size
+        ).reshape(len(starts), size)
+
+        return np.log2(lengths) - self.plogp[counts].sum(axis=1) / lengths
+
+    def finditer(self, text):
+        """
+        Find the highest scoring window of every high entropy run in the text, in the order they appear
+        """
+        if len(text) < self.min_length:
+            return iter(())
+
+        # Non-ASCII characters are replaced one for one so byte offsets remain character offsets
+        data = np.frombuffer(text.encode('ascii', 'replace'), dtype=np.uint8)
+        matches = []
+
+        for name, (members, symbols, size), threshold, skip_object_ids in self.thresholds:
+            if threshold is None:
+                continue
+
+            starts, ends = self._runs(members[data])
+
+            if skip_object_ids:
+                keep = np.ones(len(starts), dtype=bool)
+
+                for index in np.flatnonzero(np.isin(ends - starts, OBJECT_ID_LENGTHS)):
+                    keep[index] = OBJECT_ID_REGEX.fullmatch(text, int(starts[index]), int(ends[index])) is None
+
+                starts, ends = starts[keep], ends[keep]
+
+            if not len(starts):
+                continue
+
+            run, window_starts, window_lengths = self._windows(starts, ends)
+            scores = self._entropy(data, symbols, size, window_starts, window_lengths)
+
+            # Windows ordered by run then by falling score, so each run's first window is its best
+            order = np.lexsort((-scores, run))
+            _, first = np.unique(run[order], return_index=True)
+            best = order[first]
+
+            for index in best[scores[best] >= threshold]:
+                start, end = int(window_starts[index]), int(window_starts[index] + window_lengths[index])
+                matches.append(Match(name, text[start:end], start))
+
+        matches.sort(key=lambda match: match.start)
+
+        return iter(matches)
+
+    def search(self, text):
+        """
+        Find the first high entropy window in the text, or None
+        """
+        return next(self.finditer(text), None)
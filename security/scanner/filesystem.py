@@ -0,0 +1,248 @@
+"""
+Secret scanning of plain directory trees, e.g. build artifacts or unpacked container layers
+"""
+
+import logging
+import mmap
+import os
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
+from functools import partial
+
+from blobs import is_binary
+from metrics import Metrics
+from rules import CHUNK_SIZE, RuleSet
+
+logger = logging.getLogger(__name__)
+
+# Files at least this large are memory mapped instead of read into memory
+MMAP_THRESHOLD = 1024 * 1024
+
+# Files, and bytes of files, handed to a scan process at a time
+BATCH_FILES = 64
+BATCH_BYTES = 256 * 1024 * 1024
+
+
+def _ignored(relpath, ignore):
+    """
+    Determine whether a path relative to the scanned root matches any ignore glob
+
+    Globs are matched against the whole relative path and against the name
+    alone, so `*.min.js` and `node_modules` apply at any depth.
+    """
+    name = os.path.basename(relpath)
+
+    return any(fnmatch(relpath, pattern) or fnmatch(name, pattern) for pattern in ignore)
+
+
+def _list_dir(root, path, ignore):
+    """
+    List a directory's regular files as (path, size) pairs and its subdirectories, skipping ignored paths
+    """
+    files = []
+    dirs = []
+
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if ignore and _ignored(os.path.relpath(entry.path, root), ignore):
+                    continue
+
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+    except OSError as err:
+        logger.info("Unable to list {}: {}".format(path, err))
+
+    return files, dirs
+
+
+def walk(root, ignore=(), workers=8):
+    """
+    Yield (path, size) for every regular file below `root`, listing directories on a thread pool
+
+    Symbolic links are not followed. Files are yielded as soon as their
+    directory has been listed, in no particular order.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_list_dir, root, root, ignore)}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                files, dirs = future.result()
+                pending.update(pool.submit(_list_dir, root, path, ignore) for path in dirs)
+
+                for item in files:
+                    yield item
+
+
+def _count_lines(data, start, end, chunk_size=CHUNK_SIZE):
+    """
+    Count the newlines in a slice of bytes or a memory map, copying at most `chunk_size` bytes at a time
+    """
+    return sum(data[i:min(end, i + chunk_size)].count(b'\n') for i in range(start, end, chunk_size))
+
+
+def scan_file(path, rules, allowlist=None, mmap_threshold=MMAP_THRESHOLD):
+    """
+    Scan a single file, returning (line number, match) pairs or None if it is binary
+
+    Large files are memory mapped so the rules run over the page cache
+    directly and no file is ever read into memory whole.
+    """
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+
+        if size == 0:
+            return []
+
+        if size < mmap_threshold:
+            data = fh.read()
+        else:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+
+    try:
+        if is_binary(data):
+            return None
+
+        results = []
+        line, position = 1, 0
+
+        for match in sorted(rules.finditer_bytes(data), key=lambda match: match.start):
+            if allowlist is not None and match.secret in allowlist:
+                continue
+
+            line += _count_lines(data, position, match.start)
+            position = match.start
+            results.append((line, match))
+
+        return results
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def scan_files(paths, rules=None, allowlist=None, mmap_threshold=MMAP_THRESHOLD):
+    """
+    Scan a batch of files, run inside the filesystem scan's worker processes
+
+    Returns the findings as (path, line, rule, secret) tuples along with the
+    worker's metrics.
+    """
+    rules = rules or RuleSet()
+    metrics = Metrics()
+    findings = []
+
+    for path in paths:
+        try:
+            results = scan_file(path, rules, allowlist=allowlist, mmap_threshold=mmap_threshold)
+        except (OSError, ValueError) as err:
+            logger.info("Unable to scan {}: {}".format(path, err))
+            metrics.increment('files_unreadable')
+            continue
+
+        if results is None:
+            metrics.increment('files_binary')
+            continue
+
+        metrics.increment('files_scanned')
+        metrics.increment('file_bytes', os.path.getsize(path))
+        metrics.increment('matches', len(results))
+
+        findings.extend((path, line, match.rule, match.secret) for line, match in results)
+
+    return findings, metrics.snapshot()
+
+
+class FilesystemScanner(object):
+    """
+    Scan a directory tree that is not a git repository with the same rules as commits
+
+    Directories are listed on a pool of threads while files are scanned in
+    batches on a pool of processes, with at most a few batches per process
+    queued at once so memory use stays flat however large the tree is.
+    Findings are streamed to the sink as each batch finishes, and only kept
+    to be returned keyed by path relative to the root when there is no sink
+    or `collect` asks for them.
+    """
+
+    def __init__(self, rules=None, allowlist=None, ignore=(), workers=None, walk_workers=8, sink=None,
+                 metrics=None, mmap_threshold=MMAP_THRESHOLD, collect=None):
+        self.rules = rules or RuleSet()
+        self.allowlist = allowlist
+        self.ignore = list(ignore)
+        self.workers = workers or os.cpu_count()
+        self.walk_workers = walk_workers
+        self.sink = sink
+        # Findings streamed to a sink aren't kept as well, so a large tree is scanned in bounded memory
+        self.collect = sink is None if collect is None else collect
+        self.metrics = metrics or Metrics()
+        self.mmap_threshold = mmap_threshold
+
+    def _batches(self, root):
+        """
+        Group the files below `root` into batches of a bounded number of files and bytes
+        """
+        batch, size = [], 0
+
+        for path, file_size in walk(root, ignore=self.ignore, workers=self.walk_workers):
+            batch.append(path)
+            size += file_size
+
+            if len(batch) >= BATCH_FILES or size >= BATCH_BYTES:
+                yield batch
+                batch, size = [], 0
+
+        if batch:
+            yield batch
+
+    def scan(self, root):
+        """
+        Scan every file below `root`, returning the collected findings keyed by relative path
+        """
+        suspicious = {}
+        scan = partial(scan_files, rules=self.rules, allowlist=self.allowlist, mmap_threshold=self.mmap_threshold)
+
+        logger.info("Scanning {}".format(root))
+
+        with self.metrics.timer('scan'), ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+
+            for batch in self._batches(root):
+                pending.add(pool.submit(scan, batch))
+
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(root, done, suspicious)
+
+            self._collect(root, pending, suspicious)
+
+        return suspicious
+
+    def _collect(self, root, futures, suspicious):
+        """
+        Merge the results of finished batches, streaming each finding to the sink
+        """
+        for future in futures:
+            findings, metrics = future.result()
+            self.metrics.merge(metrics)
+
+            for path, line, rule, secret in findings:
+                logger.info("Secret Found")
+                relpath = os.path.relpath(path, root)
+                finding = {"filename": relpath, "line": line, "rule": rule, "secret": secret}
+
+                if self.collect:
+                    suspicious.setdefault(relpath, []).append(finding)
+
+                self.metrics.increment('findings')
+
+                if self.sink is not None:
+                    self.sink.write(root, None, finding)
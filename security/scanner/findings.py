@@ -0,0 +1,80 @@
+"""
+Compact finding records sharing their commit's metadata
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+
+
+class CommitInfo(object):
+    """
+    Metadata of a commit with findings, created once and shared by every finding in it
+
+    The formatted date and URL are only built when they are read, e.g. when
+    a finding is serialized.
+    """
+    __slots__ = ('repo_url', 'commit')
+
+    def __init__(self, repo_url, commit):
+        self.repo_url = repo_url
+        self.commit = commit
+
+    @property
+    def hexsha(self):
+        return self.commit.hexsha
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(self.commit.committed_date).strftime("%c")
+
+    @property
+    def url(self):
+        return "{}/commit/{}".format(self.repo_url[:-4], self.commit.hexsha)
+
+
+class Finding(Mapping):
+    """
+    A secret discovered in a commit, readable as the finding dict reported by the scanner
+
+    Only the match itself is stored per finding, everything else is looked up
+    on the shared CommitInfo. Findings compare equal to the equivalent dict
+    and `dict(finding)` gives a plain copy. `path` is the file's path within
+    the repository, where `filename` is only its name.
+    """
+    __slots__ = ('info', 'filename', 'line', 'rule', 'secret', 'path')
+
+    KEYS = ('author', 'committer', 'date', 'url', 'filename', 'line', 'rule', 'secret')
+
+    def __init__(self, info, filename, line, rule, secret, path=None):
+        self.info = info
+        self.filename = filename
+        self.path = path or filename
+        self.line = line
+        self.rule = rule
+        self.secret = secret
+
+    def __getitem__(self, key):
+        if key == 'author':
+            return self.info.commit.author_name
+        elif key == 'committer':
+            return {"name": self.info.commit.committer_name, "email": self.info.commit.committer_email}
+        elif key == 'date':
+            return self.info.date
+        elif key == 'url':
+            return self.info.url
+        elif key in ('filename', 'line', 'rule', 'secret'):
+            return getattr(self, key)
+
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return (Finding, (self.info, self.filename, self.line, self.rule, self.secret, self.path))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+
+"""
+Indexed database of findings for triage across every scan
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+
+from datetime import datetime
+
+from findings import Finding
+from sinks import FindingSink
+
+# Findings buffered by a DatabaseSink before they are inserted in a single transaction
+INSERT_BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    rule TEXT NOT NULL,
+    secret TEXT NOT NULL,
+    author TEXT,
+    committer_name TEXT,
+    committer_email TEXT,
+    date INTEGER,
+    url TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS findings_location ON findings (repo, commit_sha, filename, line, rule, secret);
+CREATE INDEX IF NOT EXISTS findings_secret ON findings (secret);
+CREATE INDEX IF NOT EXISTS findings_commit ON findings (commit_sha);
+CREATE INDEX IF NOT EXISTS findings_author ON findings (author, date);
+CREATE INDEX IF NOT EXISTS findings_date ON findings (date);
+"""
+
+COLUMNS = (
+    'repo', 'commit_sha', 'filename', 'line', 'rule', 'secret', 'author', 'committer_name', 'committer_email', 'date',
+    'url'
+)
+
+# Columns findings can be counted by, mapped to their names on the command line
+COUNT_COLUMNS = {
+    'repo': 'repo',
+    'commit': 'commit_sha',
+    'secret': 'secret',
+    'author': 'author',
+    'rule': 'rule',
+}
+
+
+def _row(repo_url, commit_sha, finding):
+    """
+    Flatten a finding into a row of the findings table
+
+    Findings from the scanner keep the commit timestamp so dates can be
+    queried by range, findings without a commit, e.g. from a filesystem
+    scan, are stored with an empty commit.
+    """
+    if isinstance(finding, Finding):
+        commit = finding.info.commit
+
+        return (
+            repo_url, commit_sha or '', finding.filename, finding.line, finding.rule, finding.secret,
+            commit.author_name, commit.committer_name, commit.committer_email, commit.committed_date, finding.info.url
+        )
+
+    committer = finding.get('committer') or {}
+
+    return (
+        repo_url, commit_sha or '', finding['filename'], finding['line'], finding['rule'], finding['secret'],
+        finding.get('author'), committer.get('name'), committer.get('email'), None, finding.get('url')
+    )
+
+
+class FindingsDatabase(object):
+    """
+    SQLite database of every finding from every scan, indexed for triage queries
+
+    Findings are indexed on secret, repository, commit, author and date, so
+    questions such as every repository a key leaked into are answered from
+    an index however many findings are stored. Recording the same finding
+    twice, e.g. when a repository is re-scanned, stores it once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Writes may come from any thread of a scan, DatabaseSink serializes them
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def insert(self, rows):
+        """
+        Insert rows built by `_row` in a single transaction
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO findings ({}) VALUES ({})".format(
+                    ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS))
+                ),
+                rows
+            )
+
+    def record(self, repo_url, suspicious):
+        """
+        Record every finding of a scan result keyed by commit
+        """
+        self.insert(
+            _row(repo_url, commit_sha, finding) for commit_sha, findings in suspicious.items() for finding in findings
+        )
+
+    def _where(self, secret=None, repo=None, commit=None, author=None, rule=None, since=None, until=None):
+        """
+        Build the WHERE clause and parameters matching findings by any combination of fields
+        """
+        clauses = []
+        params = []
+
+        for column, value in (
+                ('secret', secret), ('repo', repo), ('commit_sha', commit), ('author', author), ('rule', rule)):
+            if value is not None:
+                clauses.append('{} = ?'.format(column))
+                params.append(value)
+
+        if since is not None:
+            clauses.append('date >= ?')
+            params.append(since)
+
+        if until is not None:
+            clauses.append('date < ?')
+            params.append(until)
+
+        return ('WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, limit=None, **filters):
+        """
+        Find findings by secret, repo, commit, author, rule or a date range, most recent first
+
+        `since` and `until` are Unix timestamps.
+        """
+        where, params = self._where(**filters)
+        sql = "SELECT {} FROM findings {} ORDER BY date DESC, id DESC".format(', '.join(COLUMNS), where)
+
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        results = []
+
+        for row in self.conn.execute(sql, params):
+            row = dict(zip(COLUMNS, row))
+
+            results.append({
+                "repo": row['repo'],
+                "commit": row['commit_sha'] or None,
+                "filename": row['filename'],
+                "line": row['line'],
+                "rule": row['rule'],
+                "secret": row['secret'],
+                "author": row['author'],
+                "committer": {"name": row['committer_name'], "email": row['committer_email']},
+                "date": datetime.fromtimestamp(row['date']).strftime("%c") if row['date'] is not None else None,
+                "url": row['url'],
+            })
+
+        return results
+
+    def count(self, by, limit=None, **filters):
+        """
+        Count the findings matching the filters by repo, commit, secret, author or rule, largest first
+        """
+        column = COUNT_COLUMNS[by]
+        where, params = self._where(**filters)
+        sql = "SELECT {0}, COUNT(*) FROM findings {1} GROUP BY {0} ORDER BY COUNT(*) DESC, {0}".format(column, where)
+
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return self.conn.execute(sql, params).fetchall()
+
+    def close(self):
+        """
+        Close the findings database
+        """
+        self.conn.close()
+
+
+class DatabaseSink(FindingSink):
+    """
+    Record findings in a FindingsDatabase, inserted in batches as the scan runs
+
+    Closing the sink inserts the last batch and closes the database.
+    """
+
+    def __init__(self, database, batch_size=INSERT_BATCH_SIZE):
+        FindingSink.__init__(self)
+        self.database = database
+        self.batch_size = batch_size
+        self.rows = []
+
+    def _write(self, repo_url, commit_sha, finding):
+        self.rows.append(_row(repo_url, commit_sha, finding))
+
+        if len(self.rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        self.database.insert(self.rows)
+        self.rows = []
+
+    def close(self):
+        with self.lock:
+            if self.rows:
+                self._flush()
+
+            self.database.close()
+
+
+def _timestamp(date):
+    """
+    Convert a YYYY-MM-DD date on the command line into a Unix timestamp
+    """
+    try:
+        return int(datetime.strptime(date, '%Y-%m-%d').timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid date {!r}, expected YYYY-MM-DD".format(date))
+
+
+def main(argv=None, stream=sys.stdout):
+    parser = argparse.ArgumentParser(description='Query the findings recorded by scanner.py --findings-db')
+
+    parser.add_argument(
+        'database',
+        help='Findings database to query',
+    )
+
+    parser.add_argument(
+        '--secret',
+        dest="secret",
+        help='Only findings of this secret',
+    )
+
+    parser.add_argument(
+        '--repo',
+        dest="repo",
+        help='Only findings in this repository clone URL, or directory of a filesystem scan',
+    )
+
+    parser.add_argument(
+        '--commit',
+        dest="commit",
+        help='Only findings introduced by this full commit SHA',
+    )
+
+    parser.add_argument(
+        '--author',
+        dest="author",
+        help='Only findings in commits by this author name',
+    )
+
+    parser.add_argument(
+        '--rule',
+        dest="rule",
+        help='Only findings of this detection rule, e.g. aws-access-key-id',
+    )
+
+    parser.add_argument(
+        '--since',
+        dest="since",
+        type=_timestamp,
+        help='Only findings committed on or after this YYYY-MM-DD date',
+    )
+
+    parser.add_argument(
+        '--until',
+        dest="until",
+        type=_timestamp,
+        help='Only findings committed before this YYYY-MM-DD date',
+    )
+
+    parser.add_argument(
+        '--count-by',
+        dest="count_by",
+        choices=sorted(COUNT_COLUMNS),
+        help='Count the matching findings by a field instead of listing them, e.g. every repo a secret leaked into',
+    )
+
+    parser.add_argument(
+        '--limit',
+        dest="limit",
+        type=int,
+        help='Maximum number of findings or counts to print',
+    )
+
+    args = parser.parse_args(argv)
+
+    filters = {
+        'secret': args.secret, 'repo': args.repo, 'commit': args.commit, 'author': args.author, 'rule': args.rule,
+        'since': args.since, 'until': args.until,
+    }
+
+    with FindingsDatabase(args.database) as database:
+        if args.count_by:
+            for value, count in database.count(args.count_by, limit=args.limit, **filters):
+                stream.write("{}\t{}\n".format(count, value))
+        else:
+            for finding in database.query(limit=args.limit, **filters):
+                stream.write(json.dumps(finding, sort_keys=True) + '\n')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,576 @@
+"""
+Streaming git history reader
+"""
+
+import re
+import subprocess
+import sys
+import tempfile
+
+from bisect import bisect_right
+from collections import namedtuple
+from functools import partial
+
+Commit = namedtuple('Commit', ['hexsha', 'author_name', 'committer_name', 'committer_email', 'committed_date'])
+FileDiff = namedtuple('FileDiff', ['filename', 'header', 'lines'])
+Skipped = namedtuple('Skipped', ['filename', 'reason', 'size'])
+BlobChange = namedtuple('BlobChange', ['filename', 'path', 'blob', 'parent_blobs'])
+
+# Commit headers are prefixed with a NUL byte, which can never appear in a textual diff line
+COMMIT_MARKER = '\x00commit '
+LOG_FORMAT = '%x00commit %H%x00%an%x00%cn%x00%ce%x00%ct'
+
+DIFF_MARKER = 'diff --git '
+
+HEADER_PREFIXES = (COMMIT_MARKER.encode('ascii'), DIFF_MARKER.encode('ascii'))
+
+# Largest piece of a diff held in memory at once, longer files and lines are scanned a piece at a time
+DIFF_CHUNK_SIZE = 1024 * 1024
+
+# Bytes repeated at the start of the next piece when a line has to be cut with no separator to cut after,
+# wider than any rule window so a secret straddling the cut is still seen whole in one of the pieces
+SPLIT_OVERLAP = 4096
+
+# Dependency lockfiles, generated and often huge
+LOCKFILES = frozenset([
+    'Cargo.lock', 'Gemfile.lock', 'Pipfile.lock', 'composer.lock', 'go.sum', 'package-lock.json', 'pnpm-lock.yaml',
+    'poetry.lock', 'yarn.lock',
+])
+
+MINIFIED_REGEX = re.compile(r'[.-]min\.(?:js|css)$|\.(?:js|css)\.map$')
+
+HUNK_REGEX = re.compile(r'^@@ -\d+(?:,\d+)? \+(?P<start>\d+)(?:,\d+)? @@')
+
+# Submodules are recorded as gitlinks pointing at commits in another repository
+GITLINK_MODE = '160000'
+
+
+def _decode(line):
+    """
+    Decode a line of git output, stripping the line terminator
+    """
+    return line.decode('utf-8', 'replace').rstrip('\r\n')
+
+
+def _filename(header):
+    """
+    Extract the file name from a "diff --git a/<path> b/<path>" header
+    """
+    if '/' in header:
+        return header.split()[0].split('/')[-1]
+
+    return header.split()[0]
+
+
+def diff_path(header):
+    """
+    Extract the path of the new file from a "diff --git a/<path> b/<path>" header
+    """
+    if ' b/' in header:
+        return header.rsplit(' b/', 1)[1]
+
+    return header.split()[-1]
+
+
+def added_lines(lines):
+    """
+    Walk a file diff's hunks, yielding the new file line number and text of every added line
+
+    Context and removed lines are skipped without being scanned, and the
+    file headers preceding the first hunk are never mistaken for content.
+    """
+    number = None
+
+    for line in lines:
+        if line.startswith('@@'):
+            hunk = HUNK_REGEX.match(line)
+            number = int(hunk.group('start')) if hunk else None
+        elif number is None:
+            continue
+        elif line.startswith('+'):
+            yield number, line[1:]
+            number += 1
+        elif line.startswith(' '):
+            number += 1
+
+
+def added_text(lines):
+    """
+    Join the lines a file diff adds into one text so it can be matched in a single pass
+
+    Returns the text and a function mapping an offset within it back to the
+    line number in the new file, or None when nothing was added.
+    """
+    numbers = []
+    offsets = []
+    texts = []
+    offset = 0
+
+    for number, text in added_lines(lines):
+        numbers.append(number)
+        offsets.append(offset)
+        texts.append(text)
+        offset += len(text) + 1
+
+    if not texts:
+        return None, None
+
+    return '\n'.join(texts), lambda position: numbers[bisect_right(offsets, position) - 1]
+
+
+def _commit(line):
+    """
+    Build a Commit record from a formatted commit header line
+    """
+    hexsha, author_name, committer_name, committer_email, committed_date = \
+        line[len(COMMIT_MARKER):].split('\x00')
+
+    return Commit(hexsha, author_name, committer_name, committer_email, int(committed_date))
+
+
+def _stream(cmd, repo_path, parser, stdin=None):
+    """
+    Run a git command and feed its output through a parser, killing git once the parser is closed
+
+    `stdin` lines are written before any output is read, which is safe for
+    git commands that consume all of their input before producing output.
+    Once the output has been read to the end, a git failure such as a bad
+    revision raises CalledProcessError rather than passing for an empty result.
+    """
+    # stderr goes to a file so a chatty git can never block on a full pipe
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(
+            cmd, cwd=repo_path, stdout=subprocess.PIPE, stderr=errors,
+            stdin=None if stdin is None else subprocess.PIPE
+        )
+
+        try:
+            if stdin is not None:
+                try:
+                    for line in stdin:
+                        proc.stdin.write(line.encode('ascii') + b'\n')
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    # git exited early, its exit status says why
+                    pass
+
+            for record in parser(proc.stdout):
+                yield record
+
+            proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+        if proc.returncode != 0:
+            errors.seek(0)
+            raise subprocess.CalledProcessError(
+                proc.returncode, cmd, stderr=errors.read().decode('utf-8', 'replace').strip()
+            )
+
+
+def _read_lines(stream, size, overlap=SPLIT_OVERLAP):
+    """
+    Read git output in blocks of lines without line terminators, holding at most `size` bytes of any line
+
+    Yields lists of lines along with whether the first continues the last
+    line of the previous list. Lines longer than `size`, e.g. minified code,
+    are yielded in pieces split after the last statement or list separator
+    where there is one. Where there is none the line is cut at `size` and the
+    next piece starts `overlap` bytes before the cut, so a secret up to
+    `overlap` bytes long is whole in one piece, and may be found in both.
+    Commit and file headers are never split.
+    """
+    tail = b''
+    continued = False
+    overlap = min(overlap, size // 4)
+
+    while True:
+        block = stream.read1(size)
+
+        if not block:
+            if tail:
+                yield [tail], continued
+            return
+
+        lines = (tail + block).split(b'\n')
+        tail = lines.pop()
+
+        if lines:
+            yield lines, continued
+            continued = False
+
+        while len(tail) >= size and (continued or not tail.startswith(HEADER_PREFIXES)):
+            end = max(tail.rfind(b';', 0, size), tail.rfind(b',', 0, size), tail.rfind(b'}', 0, size)) + 1
+
+            if end <= size // 2:
+                yield [tail[:size]], continued
+                tail, continued = tail[size - overlap:], True
+                continue
+
+            yield [tail[:end]], continued
+            tail, continued = tail[end:], True
+
+
+class DiffLimits(object):
+    """
+    Limits on how much of each commit's diff is scanned
+
+    `max_file_bytes` and `max_commit_bytes` cap the diff scanned for a single
+    file and for a whole commit, anything beyond is skipped. Lockfiles and
+    minified assets can be skipped outright as they are large, generated and
+    rarely hold secrets.
+    """
+
+    def __init__(self, max_file_bytes=None, max_commit_bytes=None, skip_lockfiles=False, skip_minified=False):
+        self.max_file_bytes = max_file_bytes
+        self.max_commit_bytes = max_commit_bytes
+        self.skip_lockfiles = skip_lockfiles
+        self.skip_minified = skip_minified
+
+    def skip_reason(self, filename):
+        """
+        Determine why a file's diff is skipped entirely, or None if it is scanned
+        """
+        if self.skip_lockfiles and filename in LOCKFILES:
+            return 'lockfile'
+
+        if self.skip_minified and MINIFIED_REGEX.search(filename):
+            return 'minified'
+
+        return None
+
+
+class _FileDiffBuffer(object):
+    """
+    The part of a file diff read since it was last yielded
+    """
+
+    def __init__(self, header, reason=None):
+        self.header = header
+        self.filename = _filename(header)
+        self.reason = reason
+        self.lines = []
+        self.hunk = None
+        self.adding = False
+        self.buffered = 0
+        self.skipped = 0
+        self.pieces = 0
+
+    def position(self):
+        """
+        Determine the new file line number of the next line, and whether the last line was an added line
+
+        Lines are only counted from the last hunk header, so the cost is
+        bounded by the size of the buffer.
+        """
+        hunk = HUNK_REGEX.match(self.lines[self.hunk]) if self.hunk is not None else None
+
+        if hunk is None:
+            return None, False
+
+        lines = self.lines[self.hunk + 1:]
+        number = int(hunk.group('start')) + sum(1 for line in lines if line[:1] in ('+', ' '))
+
+        return number, lines[-1][:1] == '+' if lines else self.adding
+
+    def extend(self, text):
+        """
+        Buffer the continuation of an overlong line, as another added line with the same line number
+
+        Continuations of context and removed lines are dropped as they are never scanned.
+        """
+        number, adding = self.position()
+
+        if adding:
+            self.hunk = len(self.lines)
+            self.lines.append('@@ -0,0 +{} @@'.format(number - 1))
+            self.lines.append('+' + text)
+            self.buffered += len(text) + 1
+
+    def flush(self, final=False):
+        """
+        Take the buffered lines as a FileDiff, or None if there are none to scan
+
+        Unless this is the end of the file diff, buffering resumes with a hunk
+        header so the lines that follow keep their line numbers.
+        """
+        diff = None
+
+        if self.buffered or (self.pieces == 0 and self.reason is None):
+            diff = FileDiff(self.filename, self.header, self.lines)
+            self.pieces += 1
+
+        number, self.adding = (None, False) if final else self.position()
+
+        self.lines = [] if number is None else ['@@ -0,0 +{} @@'.format(number)]
+        self.hunk = 0 if self.lines else None
+        self.buffered = 0
+
+        return diff
+
+
+def parse_history(stream, limits=None, chunk_size=DIFF_CHUNK_SIZE):
+    """
+    Parse `git log -p` output into a stream of Commit, FileDiff and Skipped records
+
+    git's output is read at most `chunk_size` bytes at a time and a file's
+    diff is yielded as several FileDiff records once it grows beyond
+    `chunk_size`, so memory use is bounded however large a commit, file or
+    line is. Added lines keep their line numbers in the new file across
+    records. Diff content dropped by `limits` is reported with a Skipped
+    record once the file's diff ends.
+    """
+    limits = limits or DiffLimits()
+    max_file_bytes = limits.max_file_bytes or sys.maxsize
+    max_commit_bytes = limits.max_commit_bytes or sys.maxsize
+    diff = None
+    file_size = commit_size = 0
+
+    def finish():
+        record = diff.flush(final=True)
+
+        if record is not None:
+            yield record
+
+        if diff.skipped:
+            yield Skipped(diff.filename, diff.reason, diff.skipped)
+
+    for pieces, continued in _read_lines(stream, chunk_size):
+        for piece in pieces:
+            continuation, continued = continued, False
+
+            if not continuation and piece.startswith(HEADER_PREFIXES):
+                if diff is not None:
+                    for record in finish():
+                        yield record
+                    diff = None
+
+                line = _decode(piece)
+
+                if line.startswith(COMMIT_MARKER):
+                    commit_size = 0
+                    yield _commit(line)
+                else:
+                    header = line[len(DIFF_MARKER):]
+                    diff = _FileDiffBuffer(header, limits.skip_reason(_filename(header)))
+                    file_size = 0
+
+                continue
+            elif diff is None:
+                continue
+
+            size = len(piece) + 1
+            file_size += size
+            commit_size += size
+
+            if diff.reason is None and (file_size > max_file_bytes or commit_size > max_commit_bytes):
+                diff.reason = 'file-size' if file_size > max_file_bytes else 'commit-size'
+
+            if diff.reason is not None:
+                diff.skipped += size
+                continue
+
+            if continuation:
+                diff.extend(_decode(piece))
+            else:
+                line = piece.decode('utf-8', 'replace').rstrip('\r')
+
+                if line.startswith('@@'):
+                    diff.hunk = len(diff.lines)
+
+                diff.lines.append(line)
+                diff.buffered += size
+
+            if diff.buffered >= chunk_size:
+                record = diff.flush()
+
+                if record is not None:
+                    yield record
+
+    if diff is not None:
+        for record in finish():
+            yield record
+
+
+def scan_diffs(history, scan):
+    """
+    Pair each record of a history stream with the (line number, match) pairs `scan` finds in its diff
+
+    `scan` is called with the lines of every FileDiff record and other
+    records are paired with None. The next piece of an overlong line cut with
+    no separator repeats the end of the previous piece, so findings repeated
+    from the previous piece of the same file diff are dropped.
+    """
+    header, previous = None, set()
+
+    for record in history:
+        if not isinstance(record, FileDiff):
+            if isinstance(record, Commit):
+                header = None
+
+            yield record, None
+            continue
+
+        found = scan(record.lines)
+        repeated = previous if record.header == header else set()
+        header, previous = record.header, set((line, match.rule, match.secret) for line, match in found)
+
+        yield record, [(line, match) for line, match in found if (line, match.rule, match.secret) not in repeated]
+
+
+def iter_history(repo_path, revisions=None, commits=None, limits=None, git='git'):
+    """
+    Stream a repository's history through a single `git log -p` process
+
+    Yields a Commit record followed by a FileDiff record for every file the
+    commit touches, in `git log` order, and a Skipped record for every file
+    whose diff was cut short by `limits`. When `commits` is given exactly those
+    commits are streamed in the order supplied instead of walking `revisions`.
+    The git process is terminated as soon as the generator is closed, so
+    callers may stop consuming early.
+    """
+    if commits is not None and not commits:
+        # git log falls back to HEAD when --stdin is given no revisions
+        return (record for record in ())
+
+    cmd = [git, 'log', '-p', '--no-color', '--no-ext-diff', '--format={}'.format(LOG_FORMAT)]
+
+    if commits is not None:
+        cmd.extend(['--no-walk=unsorted', '--stdin'])
+    else:
+        cmd.extend(revisions or ['HEAD'])
+    cmd.append('--')
+
+    return _stream(cmd, repo_path, partial(parse_history, limits=limits), stdin=commits)
+
+
+def list_commits(repo_path, revisions=None, git='git'):
+    """
+    List the commits reachable from `revisions` in the same order `iter_history` walks them
+    """
+    cmd = [git, 'rev-list'] + (revisions or ['HEAD']) + ['--']
+
+    return _stream(cmd, repo_path, lambda stream: (_decode(line) for line in stream))
+
+
+def list_refs(repo_path, git='git'):
+    """
+    Map every branch, remote branch and tag to the commit it points at
+
+    Annotated tags are peeled to their commit and refs to other objects are skipped.
+    """
+    cmd = [
+        git, 'for-each-ref', '--format=%(refname)%00%(objecttype)%00%(objectname)%00%(*objecttype)%00%(*objectname)',
+        'refs/heads', 'refs/remotes', 'refs/tags'
+    ]
+    refs = {}
+
+    for line in _stream(cmd, repo_path, lambda stream: (_decode(line) for line in stream)):
+        refname, objtype, sha, peeled_type, peeled = line.split('\x00')
+
+        if objtype == 'commit':
+            refs[refname] = sha
+        elif peeled_type == 'commit':
+            refs[refname] = peeled
+
+    return refs
+
+
+def list_missing_blobs(repo_path, revisions=None, git='git'):
+    """
+    List the objects reachable from `revisions` that a partial clone has not fetched yet
+
+    `--missing=print` reports missing objects instead of fetching them one
+    at a time from the promisor remote.
+    """
+    cmd = [git, 'rev-list', '--objects', '--missing=print'] + (revisions or ['HEAD']) + ['--']
+
+    return _stream(
+        cmd, repo_path, lambda stream: (line[1:] for line in (_decode(line) for line in stream) if line[:1] == '?')
+    )
+
+
+def is_null_sha(sha):
+    """
+    Determine whether a sha is git's all zero placeholder for a created or deleted ref, of any hash length
+    """
+    return not sha or not sha.strip('0')
+
+
+def has_commit(repo_path, sha, git='git'):
+    """
+    Determine whether a commit exists in a repository, e.g. it was not removed by a force push
+    """
+    return subprocess.call(
+        [git, 'cat-file', '-e', '{}^{{commit}}'.format(sha)], cwd=repo_path, stderr=subprocess.DEVNULL
+    ) == 0
+
+
+def is_empty(repo_path, git='git'):
+    """
+    Determine whether a repository has no commits at all, e.g. a newly created GitHub repository
+    """
+    head = subprocess.call(
+        [git, 'rev-parse', '--verify', '--quiet', 'HEAD'], cwd=repo_path, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    return head != 0 and not list_refs(repo_path, git=git)
+
+
+def is_shallow(repo_path, git='git'):
+    """
+    Determine whether a clone's history was truncated with a depth or date limit
+    """
+    output = subprocess.check_output([git, 'rev-parse', '--is-shallow-repository'], cwd=repo_path)
+
+    return output.strip() == b'true'
+
+
+def parse_raw_history(stream):
+    """
+    Parse `git log --raw` output into a stream of Commit and BlobChange records
+
+    Merges are listed in git's combined format, with a mode and blob for each
+    parent before the merge's own. Deletions, submodule updates and pure
+    renames and copies are skipped as they do not introduce a blob. Each
+    change carries the blobs the path, or the path it was renamed from, had in
+    the parents, so only what a commit added to a file is attributed to it.
+    """
+    for line in stream:
+        line = _decode(line)
+
+        if line.startswith(COMMIT_MARKER):
+            yield _commit(line)
+        elif line.startswith(':'):
+            meta, paths = line.split('\t', 1)
+            parents = len(meta) - len(meta.lstrip(':'))
+            fields = meta[parents:].split()
+            new_mode, blob, status = fields[parents], fields[2 * parents + 1], fields[-1]
+
+            if is_null_sha(blob) or new_mode == GITLINK_MODE or status in ('R100', 'C100'):
+                continue
+
+            path = paths.split('\t')[-1]
+            parent_blobs = tuple(sha for sha in fields[parents + 1:2 * parents + 1] if not is_null_sha(sha))
+            yield BlobChange(path.split('/')[-1], path, blob, parent_blobs)
+
+
+def iter_blob_changes(repo_path, revisions=None, git='git'):
+    """
+    Stream the blobs introduced by every commit reachable from the refs
+
+    Yields a Commit record followed by a BlobChange record for every file the
+    commit adds or modifies, using a single `git log --raw` process with
+    rename detection, so a moved file is not taken for a new one. A merge
+    yields the files it leaves different from every parent, e.g. where a
+    conflict was resolved, as every other blob came from one of its parents.
+    """
+    cmd = [git, 'log', '--raw', '-c', '-M', '--no-abbrev', '--no-color', '--format={}'.format(LOG_FORMAT)]
+    cmd.extend(revisions or ['--all'])
+    cmd.append('--')
+
+    return _stream(cmd, repo_path, parse_raw_history)
@@ -0,0 +1,96 @@
+"""
+On-disk cache of GitHub API responses for ETag revalidation
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from collections import namedtuple
+
+CachedResponse = namedtuple('CachedResponse', ['etag', 'headers', 'body'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+class ResponseCache(object):
+    """
+    SQLite backed cache of response bodies keyed by URL
+
+    Each entry keeps the ETag it was served with so it can be revalidated
+    with a conditional request. Once the cached bodies exceed `max_bytes`
+    the least recently used entries are evicted. The cache may be shared
+    between threads.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def get(self, url):
+        """
+        Get the cached response for a URL, marking it as recently used
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT etag, headers, body FROM responses WHERE url = ?", (url,)).fetchone()
+
+            if row is None:
+                return None
+
+            with self.conn:
+                self.conn.execute("UPDATE responses SET accessed = ? WHERE url = ?", (self.clock(), url))
+
+        return CachedResponse(row[0], json.loads(row[1]), bytes(row[2]))
+
+    def put(self, url, etag, headers, body):
+        """
+        Cache a response, evicting the least recently used responses when over the size limit
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, headers, body, size, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, json.dumps(headers), sqlite3.Binary(body), len(body), self.clock())
+            )
+
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+            if total > self.max_bytes:
+                for evict, size in self.conn.execute(
+                        "SELECT url, size FROM responses ORDER BY accessed").fetchall():
+                    self.conn.execute("DELETE FROM responses WHERE url = ?", (evict,))
+                    total -= size
+
+                    if total <= self.max_bytes:
+                        break
+
+    def size(self):
+        """
+        Total size of the cached response bodies in bytes
+        """
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        """
+        Close the cache database
+        """
+        self.conn.close()
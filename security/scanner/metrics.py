@@ -0,0 +1,182 @@
+"""
+Counters and timers describing where a scan spends its time
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+# Prometheus metric names may only contain these characters
+INVALID_NAME_REGEX = re.compile(r'[^a-zA-Z0-9_:]')
+
+
+class Metrics(object):
+    """
+    Thread safe counters, timers and gauges of a scan
+
+    Counters only ever grow, e.g. API requests or diff bytes scanned, timers
+    accumulate how often and for how many seconds a stage ran, and gauges
+    hold the latest value of a reading such as the remaining rate limit.
+    Snapshots are plain dicts, so worker processes return theirs to be
+    merged into the parent's metrics.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.counters = {}
+        self.timers = {}
+        self.gauges = {}
+
+    def increment(self, name, value=1):
+        """
+        Add to a counter
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds, count=1):
+        """
+        Record `count` runs of a stage taking `seconds` in total
+        """
+        with self.lock:
+            runs, total = self.timers.get(name, (0, 0.0))
+            self.timers[name] = (runs + count, total + seconds)
+
+    def gauge(self, name, value):
+        """
+        Set a gauge to its latest reading
+        """
+        with self.lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Time the body of a with statement
+        """
+        start = self.clock()
+
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start)
+
+    def snapshot(self):
+        """
+        Copy the current metrics into a JSON serializable dict
+        """
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {name: {"count": runs, "seconds": total} for name, (runs, total) in self.timers.items()},
+                "gauges": dict(self.gauges),
+            }
+
+    def merge(self, snapshot):
+        """
+        Add the counters and timers of another snapshot, e.g. one returned by a worker process
+        """
+        for name, value in snapshot["counters"].items():
+            self.increment(name, value)
+
+        for name, timer in snapshot["timers"].items():
+            self.observe(name, timer["seconds"], timer["count"])
+
+        for name, value in snapshot["gauges"].items():
+            self.gauge(name, value)
+
+    def to_json(self):
+        """
+        Render the metrics as a JSON summary
+        """
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix='scanner'):
+        """
+        Render the metrics in the Prometheus text exposition format
+
+        Counters become `<prefix>_<name>_total`, timers a summary of
+        `<prefix>_<name>_seconds` and gauges keep their name.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, suffix=''):
+            return INVALID_NAME_REGEX.sub('_', '{}_{}{}'.format(prefix, name, suffix))
+
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append('# TYPE {} counter'.format(metric(name, '_total')))
+            lines.append('{} {}'.format(metric(name, '_total'), value))
+
+        for name, timer in sorted(snapshot["timers"].items()):
+            lines.append('# TYPE {} summary'.format(metric(name, '_seconds')))
+            lines.append('{} {}'.format(metric(name, '_seconds_sum'), timer["seconds"]))
+            lines.append('{} {}'.format(metric(name, '_seconds_count'), timer["count"]))
+
+        for name, value in sorted(snapshot["gauges"].items()):
+            if value is None:
+                continue
+
+            lines.append('# TYPE {} gauge'.format(metric(name)))
+            lines.append('{} {}'.format(metric(name), value))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, format='json'):
+        """
+        Write the metrics to a file, replacing it atomically
+
+        The node exporter's textfile collector may read a `.prom` file at any
+        time, so it must never see one that is half written.
+        """
+        text = self.to_prometheus() if format == 'prometheus' else self.to_json() + '\n'
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.metrics-')
+
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                fh.write(text)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+@contextmanager
+def profiled(stream, limit=25):
+    """
+    Profile the body of a with statement, printing its hot paths to `stream`
+
+    cProfile reports the functions with the most cumulative time and
+    tracemalloc the lines that allocated the most memory still in use. Only
+    the calling process is profiled, not worker processes.
+    """
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    profile.enable()
+
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        allocations = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(limit)
+
+        stream.write("Peak traced memory: {:.1f} MB\n".format(peak / 1024 / 1024))
+        stream.write("Top {} allocations:\n".format(limit))
+
+        for stat in allocations.statistics('lineno')[:limit]:
+            stream.write("{}\n".format(stat))
@@ -0,0 +1,290 @@
+"""
+Persistent cache of bare repository mirrors shared between scans
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from git import Repo
+from git.exc import GitCommandError
+
+logger = logging.getLogger(__name__)
+
+# Only branches and tags are mirrored, GitHub's refs/pull/* would pull in every fork's pull requests
+REFSPECS = ('+refs/heads/*:refs/heads/*', '+refs/tags/*:refs/tags/*')
+
+
+def disk_usage(path):
+    """
+    Total size in bytes of the files below a directory
+    """
+    total = 0
+
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+
+    return total
+
+
+class MirrorCache(object):
+    """
+    Directory of bare mirrors kept up to date with incremental fetches
+
+    The first scan of a repository clones a bare mirror, later scans only
+    fetch the objects pushed since. Each mirror has a lock file: it is held
+    exclusively while the mirror is cloned or fetched and shared while it is
+    being scanned, so workers in other threads or processes can use the same
+    cache safely. Once the mirrors exceed `max_bytes` on disk the least
+    recently used ones that are not in use are removed.
+
+    Each mirror's size is measured once after every clone or fetch and kept
+    in a `.size` file beside it, as well as in an in-memory index of every
+    mirror, so eviction never has to walk the mirrors on disk. The index is
+    loaded from the size files the first time it is needed.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.held = {}
+        # Mirror path to (last used, size in bytes), None until loaded
+        self.index = None
+        self.total = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, repo_url):
+        """
+        Location of a repository's mirror
+        """
+        name = os.path.basename(repo_url.rstrip('/'))
+
+        if name.endswith('.git'):
+            name = name[:-4]
+
+        return os.path.join(
+            self.directory, '{}-{}.git'.format(name, hashlib.sha1(repo_url.encode('utf-8')).hexdigest()[:12])
+        )
+
+    def acquire(self, repo_url, **options):
+        """
+        Clone or refresh a repository's mirror, returning its path or None if it can't be fetched
+
+        `options` are passed to `Repo.clone_from` when the mirror is first
+        cloned, e.g. a blob filter. The mirror stays locked against eviction
+        and concurrent fetches until it is released.
+        """
+        path = self.path(repo_url)
+        fd = None
+
+        try:
+            fd = self._lock(path)
+
+            if os.path.isdir(path):
+                logger.info("Fetching {}".format(repo_url))
+                # Fetching from the remote rather than the URL keeps a partial clone's filter
+                Repo(path).git.fetch('--prune', '--quiet', 'origin', *REFSPECS)
+            else:
+                self._clone(repo_url, path, options)
+
+            os.utime(path, None)
+            self._record(path, disk_usage(path))
+
+            # Downgrade so other workers may scan the mirror at the same time
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        except (GitCommandError, OSError) as err:
+            logger.info("Unable to mirror {}: {}".format(repo_url, err))
+
+            if fd is not None:
+                os.close(fd)
+
+            return None
+
+        with self.lock:
+            self.held[repo_url] = fd
+
+        return path
+
+    def _lock(self, path, blocking=True):
+        """
+        Lock a mirror exclusively, returning the lock file's descriptor or None if it is in use and not `blocking`
+
+        Eviction deletes a mirror's lock file while holding it, so a lock
+        taken on a lock file that has since been deleted is retried on the
+        new one.
+        """
+        lock_path = path + '.lock'
+
+        while True:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+
+                if blocking:
+                    raise
+
+                return None
+
+            try:
+                if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+
+            os.close(fd)
+
+    def size(self, repo_url):
+        """
+        Size in bytes of a repository's mirror as of its last clone or fetch, 0 if it isn't mirrored
+        """
+        path = self.path(repo_url)
+
+        with self.lock:
+            if self.index is not None and path in self.index:
+                return self.index[path][1]
+
+        return self._read_size(path) if os.path.isdir(path) else 0
+
+    def _read_size(self, path):
+        """
+        Read a mirror's recorded size, only measuring it on disk when it was never recorded
+        """
+        try:
+            with open(path + '.size') as fh:
+                return int(fh.read())
+        except (OSError, ValueError):
+            size = disk_usage(path)
+
+        self._write_size(path, size)
+
+        return size
+
+    def _write_size(self, path, size):
+        """
+        Record a mirror's size beside it, replacing the file so readers never see a partial size
+        """
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, prefix='.size-', delete=False) as fh:
+            fh.write(str(size))
+
+        os.rename(fh.name, path + '.size')
+
+    def _load_index(self):
+        """
+        Index every mirror in the cache by when it was last used and its size, called with the lock held
+        """
+        if self.index is not None:
+            return
+
+        self.index = {}
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+
+            if name.endswith('.git') and os.path.isdir(path):
+                self.index[path] = (os.stat(path).st_mtime, self._read_size(path))
+
+        self.total = sum(size for _, size in self.index.values())
+
+    def _record(self, path, size):
+        """
+        Record a freshly cloned or fetched mirror's size and that it was just used
+        """
+        self._write_size(path, size)
+
+        with self.lock:
+            if self.index is not None:
+                self.total -= self.index.get(path, (0, 0))[1]
+                self.index[path] = (os.stat(path).st_mtime, size)
+                self.total += size
+
+    def _clone(self, repo_url, path, options):
+        """
+        Clone a new mirror, only moving it into place once complete
+        """
+        logger.info("Cloning {}".format(repo_url))
+        staging = tempfile.mkdtemp(prefix='.clone-', dir=self.directory)
+
+        try:
+            Repo.clone_from(repo_url, staging, bare=True, **options)
+            os.rename(staging, path)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def release(self, repo_url):
+        """
+        Release a mirror once it has been scanned, evicting mirrors if the cache is too large
+        """
+        with self.lock:
+            fd = self.held.pop(repo_url, None)
+
+        if fd is None:
+            return False
+
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+        self.evict()
+
+        return True
+
+    def evict(self):
+        """
+        Remove the least recently used mirrors until the cache fits within `max_bytes`
+        """
+        if self.max_bytes is None:
+            return []
+
+        with self.lock:
+            self._load_index()
+
+            if self.total <= self.max_bytes:
+                return []
+
+            mirrors = sorted((used, path) for path, (used, _) in self.index.items())
+
+        evicted = []
+
+        for _, path in mirrors:
+            with self.lock:
+                if self.total <= self.max_bytes:
+                    break
+
+            # Mirrors being fetched or scanned are skipped rather than waited on
+            fd = self._lock(path, blocking=False)
+
+            if fd is None:
+                continue
+
+            try:
+                logger.info("Evicting {}".format(path))
+                shutil.rmtree(path, ignore_errors=True)
+
+                for suffix in ('.size', '.lock'):
+                    try:
+                        os.unlink(path + suffix)
+                    except FileNotFoundError:
+                        pass
+
+                with self.lock:
+                    self.total -= self.index.pop(path, (0, 0))[1]
+
+                evicted.append(path)
+            finally:
+                os.close(fd)
+
+        return evicted
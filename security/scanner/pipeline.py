@@ -0,0 +1,93 @@
+"""
+Producer/consumer pipeline for scanning many repositories in parallel
+"""
+
+import logging
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ScanPipeline(object):
+    """
+    Clone repositories on a thread pool and scan them on a process pool
+
+    Cloning is I/O bound so it runs on threads, while scanning is CPU bound
+    regex work so it runs in separate processes. At most `queue_size`
+    repositories are cloning, waiting or scanning at once, which caps the
+    disk and memory used by a scan regardless of how many repositories are
+    fed in.
+    """
+
+    def __init__(self, clone, scan, cleanup, clone_workers=4, scan_workers=None, queue_size=8, on_result=None):
+        """
+        `clone(repo_url)` returns a local path or None, `scan(repo_url, path)`
+        must be picklable and returns the repository's findings, and
+        `cleanup(repo_url)` removes a local clone. `on_result(repo_url, result)`
+        is called as soon as each repository has been scanned.
+        """
+        self.clone = clone
+        self.scan = scan
+        self.cleanup = cleanup
+        self.on_result = on_result
+
+        self.clone_workers = clone_workers
+        self.scan_workers = scan_workers or os.cpu_count()
+        self.queue_size = queue_size
+
+    def run(self, repos):
+        """
+        Scan every repository, merging the results into a single report keyed by repository URL
+        """
+        report = {}
+        slots = threading.BoundedSemaphore(self.queue_size)
+
+        with ThreadPoolExecutor(max_workers=self.clone_workers) as cloners, \
+                ProcessPoolExecutor(max_workers=self.scan_workers) as scanners:
+
+            def clone(repo_url):
+                try:
+                    path = self.clone(repo_url)
+
+                    if path is None:
+                        slots.release()
+                        return None
+
+                    future = scanners.submit(self.scan, repo_url, path)
+                except Exception:
+                    finish(repo_url)
+                    raise
+
+                future.add_done_callback(lambda scanned: finish(repo_url, scanned))
+
+                return future
+
+            def finish(repo_url, scanned=None):
+                try:
+                    if self.on_result is not None and scanned is not None and scanned.exception() is None:
+                        self.on_result(repo_url, scanned.result())
+                except Exception as err:
+                    logger.info("Unable to report {}: {}".format(repo_url, err))
+                finally:
+                    self.cleanup(repo_url)
+                    slots.release()
+
+            pending = []
+
+            for repo_url in repos:
+                slots.acquire()
+                pending.append((repo_url, cloners.submit(clone, repo_url)))
+
+            for repo_url, cloning in pending:
+                try:
+                    scanning = cloning.result()
+
+                    if scanning is not None:
+                        report[repo_url] = scanning.result()
+                except Exception as err:
+                    logger.info("Unable to scan {}: {}".format(repo_url, err))
+
+        return report
@@ -0,0 +1,114 @@
+"""
+GitHub rate limit scheduling driven by response headers
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """
+    Token bucket tracking GitHub's rate limit budget
+
+    The budget is refreshed from the `X-RateLimit-*` headers of every
+    response and a token is taken for every request sent, so no extra
+    `/rate_limit` round trips are needed. Callers only wait once fewer than
+    `threshold` requests remain, and then only until the window resets. A
+    single limiter is safe to share between every thread issuing requests.
+    """
+
+    def __init__(self, threshold=5, clock=time.time, sleep=time.sleep):
+        self.threshold = threshold
+        self.clock = clock
+        self.sleep = sleep
+
+        self.lock = threading.Lock()
+
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+
+        self.sleeps = 0
+        self.slept = 0.0
+
+    def _wait_time(self):
+        """
+        Seconds until the budget allows another request, expiring a finished window
+        """
+        if self.reset is not None and self.clock() >= self.reset:
+            self.remaining, self.reset = None, None
+
+        if self.remaining is None or self.remaining > self.threshold:
+            return 0
+
+        return max(0, self.reset - self.clock())
+
+    def acquire(self):
+        """
+        Take a token for a request, waiting for the window to reset if the budget is exhausted
+        """
+        while True:
+            with self.lock:
+                wait = self._wait_time()
+
+                if not wait:
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+
+                self.sleeps += 1
+                self.slept += wait
+
+            logger.info("Sleeping for {} seconds due to rate limit".format(round(wait)))
+            self.sleep(wait)
+
+    def refund(self):
+        """
+        Return a token for a request GitHub did not count, e.g. a 304 Not Modified
+        """
+        with self.lock:
+            if self.remaining is not None:
+                self.remaining += 1
+
+    def update(self, headers):
+        """
+        Refresh the budget from a response's rate limit headers
+        """
+        if 'X-RateLimit-Remaining' not in headers or 'X-RateLimit-Reset' not in headers:
+            return
+
+        remaining = int(headers['X-RateLimit-Remaining'])
+        reset = int(headers['X-RateLimit-Reset'])
+
+        with self.lock:
+            if 'X-RateLimit-Limit' in headers:
+                self.limit = int(headers['X-RateLimit-Limit'])
+
+            # Within the same window requests still in flight were already deducted locally
+            if self.reset == reset and self.remaining is not None:
+                self.remaining = min(self.remaining, remaining)
+            elif self.reset is None or reset >= self.reset:
+                self.remaining, self.reset = remaining, reset
+
+    def exhausted(self):
+        """
+        Determine whether requests must wait for the window to reset
+        """
+        with self.lock:
+            return bool(self._wait_time())
+
+    def budget(self):
+        """
+        Report the current budget and time spent waiting, e.g. for metrics
+        """
+        with self.lock:
+            return {
+                "limit": self.limit,
+                "remaining": self.remaining,
+                "reset": self.reset,
+                "sleeps": self.sleeps,
+                "slept": self.slept,
+            }
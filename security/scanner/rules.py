@@ -0,0 +1,211 @@
+"""
+Multi-pattern secret detection rules with a literal prefilter
+"""
+
+import configparser
+import re
+import string
+
+from collections import namedtuple
+
+Match = namedtuple('Match', ['rule', 'secret', 'start'])
+
+# Characters around a prefilter hit that a rule's full regex is run over
+DEFAULT_WINDOW = 256
+
+# Bytes lowercased at a time while searching a large buffer, e.g. a memory mapped file, for anchors
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Lowercases ASCII letters only, leaving every other character and so every offset in place
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class Rule(object):
+    """
+    A secret detection rule
+
+    `pattern` must contain a named `secret` group. The rule is only evaluated
+    around occurrences of one of its `anchors`, literal strings that every
+    match must contain, which are matched case-insensitively.
+    """
+
+    def __init__(self, name, pattern, anchors, window=DEFAULT_WINDOW):
+        self.name = name
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.bytes_regex = re.compile(pattern.encode('utf-8'))
+        self.anchors = [anchor.lower() for anchor in anchors]
+        self.window = window
+
+        if 'secret' not in self.regex.groupindex:
+            raise ValueError("Rule {} has no 'secret' group".format(name))
+
+    def __repr__(self):
+        return "Rule({!r})".format(self.name)
+
+
+DEFAULT_RULES = [
+    Rule(
+        'aws-access-key-id',
+        r'(?P<secret>AKIA[0-9A-Z]{16})',
+        anchors=['AKIA'],
+        window=32,
+    ),
+    Rule(
+        'aws-temporary-access-key-id',
+        r'(?P<secret>ASIA[0-9A-Z]{16})',
+        anchors=['ASIA'],
+        window=32,
+    ),
+    Rule(
+        'aws-secret-access-key',
+        r'(?i:aws[_-]?secret[_-]?(?:access[_-]?)?key|secret[_-]?access[_-]?key)[\'"]?\s*(?::|=>|=)\s*[\'"]?'
+        r'(?P<secret>[A-Za-z0-9/+]{40})(?![A-Za-z0-9/+=])',
+        anchors=['aws_secret', 'aws-secret', 'awssecret', 'secret_access_key', 'secret-access-key', 'secretaccesskey'],
+    ),
+    Rule(
+        'aws-session-token',
+        r'(?i:(?:aws[_-]?)?session[_-]?token|x-amz-security-token)[\'"]?\s*(?::|=>|=)\s*[\'"]?'
+        r'(?P<secret>[A-Za-z0-9/+=]{100,})',
+        anchors=['session_token', 'session-token', 'sessiontoken', 'security-token'],
+        window=2048,
+    ),
+    Rule(
+        'aws-account-id',
+        r'(?i:(?:aws[_-]?)?account[_-]?id)[\'"]?\s*(?::|=>|=)\s*[\'"]?(?P<secret>[0-9]{4}-?[0-9]{4}-?[0-9]{4})(?![0-9])',
+        anchors=['account_id', 'account-id', 'accountid'],
+    ),
+]
+
+
+class RuleSet(object):
+    """
+    Evaluate many rules behind a single literal prefilter
+
+    Text is first searched for every rule anchor with plain substring search,
+    which runs far faster than any regex, and the full rule regexes are only
+    run over a window around each anchor hit.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.by_anchor = {}
+
+        for rule in self.rules:
+            for anchor in rule.anchors:
+                self.by_anchor.setdefault(anchor, []).append(rule)
+
+    def _hits(self, text):
+        """
+        Find every anchor occurrence in the text, ordered by position
+
+        `str.lower` lengthens a few non-ASCII characters, e.g. 'İ', which
+        would shift every later hit away from where the anchor really is, so
+        text that is not pure ASCII only has its ASCII letters lowercased.
+        """
+        lowered = text.lower() if text.isascii() else text.translate(ASCII_LOWER)
+        hits = []
+
+        for anchor in self.by_anchor:
+            position = lowered.find(anchor)
+
+            while position != -1:
+                hits.append((position, anchor))
+                position = lowered.find(anchor, position + 1)
+
+        hits.sort()
+
+        return hits
+
+    @classmethod
+    def from_config(cls, path):
+        """
+        Load rules from an INI file with one section per rule
+
+        Each section requires a `pattern` and a comma separated list of
+        `anchors`, and may set a `window` size.
+        """
+        config = configparser.ConfigParser(interpolation=None)
+
+        with open(path, 'r') as config_fh:
+            config.read_file(config_fh)
+
+        return cls([
+            Rule(
+                name,
+                config[name]['pattern'],
+                [anchor.strip() for anchor in config[name]['anchors'].split(',') if anchor.strip()],
+                window=config[name].getint('window', DEFAULT_WINDOW),
+            )
+            for name in config.sections()
+        ])
+
+    def finditer(self, text):
+        """
+        Find every rule match in the text, in the order their anchors appear
+        """
+        seen = set()
+
+        for position, anchor in self._hits(text):
+            for rule in self.by_anchor[anchor]:
+                start = max(0, position - rule.window)
+
+                for match in rule.regex.finditer(text, start, position + len(anchor) + rule.window):
+                    key = (rule.name, match.start('secret'))
+
+                    if key not in seen:
+                        seen.add(key)
+                        yield Match(rule.name, match.group('secret'), match.start('secret'))
+
+    def _byte_hits(self, data, chunk_size):
+        """
+        Find every anchor occurrence in a bytes-like object, ordered by position
+
+        Only `chunk_size` bytes are lowercased at a time, so memory use does
+        not depend on the size of the data. Chunks overlap by the longest
+        anchor so hits spanning a chunk boundary are found once.
+        """
+        anchors = [(anchor.encode('utf-8'), anchor) for anchor in self.by_anchor]
+        overlap = max(len(encoded) for encoded, _ in anchors) - 1 if anchors else 0
+
+        for offset in range(0, len(data), chunk_size):
+            lowered = data[offset:offset + chunk_size + overlap].lower()
+            hits = []
+
+            for encoded, anchor in anchors:
+                position = lowered.find(encoded)
+
+                while position != -1 and position < chunk_size:
+                    hits.append((offset + position, anchor))
+                    position = lowered.find(encoded, position + 1)
+
+            hits.sort()
+
+            for hit in hits:
+                yield hit
+
+    def finditer_bytes(self, data, chunk_size=CHUNK_SIZE):
+        """
+        Find every rule match in bytes or a memory map without decoding or copying all of it
+
+        Match offsets are byte offsets. The rule regexes run directly over the
+        data around each anchor hit.
+        """
+        seen = set()
+
+        for position, anchor in self._byte_hits(data, chunk_size):
+            for rule in self.by_anchor[anchor]:
+                start = max(0, position - rule.window)
+
+                for match in rule.bytes_regex.finditer(data, start, position + len(anchor) + rule.window):
+                    key = (rule.name, match.start('secret'))
+
+                    if key not in seen:
+                        seen.add(key)
+                        yield Match(rule.name, match.group('secret').decode('utf-8', 'replace'), match.start('secret'))
+
+    def search(self, text):
+        """
+        Find the first rule match in the text, or None
+        """
+        return next(self.finditer(text), None)
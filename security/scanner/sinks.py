@@ -0,0 +1,230 @@
+"""
+Streaming outputs that receive findings as soon as they are discovered
+"""
+
+import abc
+import hashlib
+import json
+import multiprocessing
+import threading
+
+from contextlib import contextmanager
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+SARIF_VERSION = '2.1.0'
+
+
+class FindingSink(abc.ABC):
+    """
+    Destination for findings, written one at a time while a scan is running
+
+    Sinks are safe to share between the threads of a scan and are closed
+    once the scan has finished. Subclasses implement `_write`, which is
+    called with the sink's lock held.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, repo_url, commit_sha, finding):
+        """
+        Record a single finding
+        """
+        with self.lock:
+            self._write(repo_url, commit_sha, finding)
+            self.count += 1
+
+    def write_all(self, repo_url, suspicious):
+        """
+        Record every finding of a scan result keyed by commit
+        """
+        for commit_sha, findings in suspicious.items():
+            for finding in findings:
+                self.write(repo_url, commit_sha, finding)
+
+    @abc.abstractmethod
+    def _write(self, repo_url, commit_sha, finding):
+        """
+        Record a single finding, called with the lock held
+        """
+
+    def close(self):
+        """
+        Finish the output
+        """
+        pass
+
+
+class CallbackSink(FindingSink):
+    """
+    Pass every finding to `callback(repo_url, commit_sha, finding)`, e.g. to raise an alert
+    """
+
+    def __init__(self, callback):
+        FindingSink.__init__(self)
+        self.callback = callback
+
+    def _write(self, repo_url, commit_sha, finding):
+        self.callback(repo_url, commit_sha, finding)
+
+
+class TeeSink(FindingSink):
+    """
+    Pass every finding on to several sinks, e.g. an output file and a findings database
+    """
+
+    def __init__(self, sinks):
+        FindingSink.__init__(self)
+        self.sinks = list(sinks)
+
+    def _write(self, repo_url, commit_sha, finding):
+        for sink in self.sinks:
+            sink.write(repo_url, commit_sha, finding)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class QueueSink(FindingSink):
+    """
+    Send every finding to a sink in the parent process over a queue from `forwarding`, e.g. from a scan worker
+    """
+
+    def __init__(self, queue):
+        FindingSink.__init__(self)
+        self.queue = queue
+
+    def _write(self, repo_url, commit_sha, finding):
+        self.queue.put((repo_url, commit_sha, finding))
+
+
+def _forward(queue, sink):
+    """
+    Write findings arriving on a queue to a sink until None arrives
+    """
+    for repo_url, commit_sha, finding in iter(queue.get, None):
+        sink.write(repo_url, commit_sha, finding)
+
+
+@contextmanager
+def forwarding(sink):
+    """
+    Yield a queue worker processes can hand to a QueueSink, writing what they send to `sink` as it arrives
+
+    Yields None when there is no sink. Findings still in the queue are
+    written before the block exits.
+    """
+    if sink is None:
+        yield None
+        return
+
+    with multiprocessing.Manager() as manager:
+        queue = manager.Queue()
+        thread = threading.Thread(target=_forward, args=(queue, sink), daemon=True)
+        thread.start()
+
+        try:
+            yield queue
+        finally:
+            queue.put(None)
+            thread.join()
+
+
+class JSONLinesSink(FindingSink):
+    """
+    Write each finding as a line of JSON, flushed immediately so it can be tailed
+    """
+
+    def __init__(self, fh):
+        FindingSink.__init__(self)
+        self.fh = fh
+
+    def _write(self, repo_url, commit_sha, finding):
+        record = dict(finding, repo=repo_url, commit=commit_sha)
+
+        self.fh.write(json.dumps(record, sort_keys=True) + '\n')
+        self.fh.flush()
+
+    def close(self):
+        self.fh.flush()
+
+
+class SARIFSink(FindingSink):
+    """
+    Write findings as a SARIF 2.1.0 log for code scanning tools
+
+    Results are streamed as they are found and the tool description, which
+    lists every rule that matched, is written once the sink is closed. Each
+    result is located by the file's path within the repository, and only a
+    hash of each secret is included, as a fingerprint.
+    """
+
+    def __init__(self, fh, tool_name='github-aws-secret-scanner'):
+        FindingSink.__init__(self)
+        self.fh = fh
+        self.tool_name = tool_name
+        self.rules = []
+        self.closed = False
+
+        self.fh.write('{{"$schema": {}, "version": {}, "runs": [{{"results": ['.format(
+            json.dumps(SARIF_SCHEMA), json.dumps(SARIF_VERSION)
+        ))
+        self.fh.flush()
+
+    def _write(self, repo_url, commit_sha, finding):
+        if finding['rule'] not in self.rules:
+            self.rules.append(finding['rule'])
+
+        result = {
+            "ruleId": finding['rule'],
+            "ruleIndex": self.rules.index(finding['rule']),
+            "level": "error",
+            "message": {
+                "text": "Possible {} committed in {}".format(finding['rule'], commit_sha) if commit_sha is not None
+                else "Possible {} found in {}".format(finding['rule'], finding['filename']),
+            },
+            "locations": [{
+                "physicalLocation": {
+                    "artifactLocation": {"uri": getattr(finding, 'path', finding['filename'])},
+                    "region": {"startLine": finding['line']},
+                },
+            }],
+            "partialFingerprints": {
+                "secretHash/v1": hashlib.sha256(finding['secret'].encode('utf-8')).hexdigest(),
+            },
+            "properties": {
+                "repository": repo_url,
+                "commit": commit_sha,
+                "author": finding.get('author'),
+                "committer": finding.get('committer'),
+                "date": finding.get('date'),
+                "url": finding.get('url'),
+            },
+        }
+
+        self.fh.write((', ' if self.count else '') + json.dumps(result, sort_keys=True))
+        self.fh.flush()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+            tool = {
+                "driver": {
+                    "name": self.tool_name,
+                    "rules": [{"id": rule} for rule in self.rules],
+                },
+            }
+
+            self.fh.write('], "tool": {}}}]}}\n'.format(json.dumps(tool, sort_keys=True)))
+            self.fh.flush()
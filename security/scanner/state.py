@@ -0,0 +1,196 @@
+"""
+Persistent scan state so re-scans only touch new commits
+"""
+
+import json
+import sqlite3
+import threading
+
+# Stay well below SQLite's limit on the number of bound parameters
+QUERY_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS etags (
+    url TEXT PRIMARY KEY,
+    etag TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS refs (
+    repo TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    tip TEXT NOT NULL,
+    PRIMARY KEY (repo, ref)
+);
+
+CREATE TABLE IF NOT EXISTS findings (
+    repo TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    finding TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS findings_repo ON findings (repo);
+
+CREATE TABLE IF NOT EXISTS partial_scans (
+    repo TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS scanned_commits (
+    sha TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS scanned_blobs (
+    sha TEXT NOT NULL,
+    config TEXT NOT NULL,
+    matches TEXT NOT NULL,
+    PRIMARY KEY (sha, config)
+) WITHOUT ROWID;
+"""
+
+
+class ScanState(object):
+    """
+    SQLite backed store of ETags, scanned ref tips and findings keyed by repository URL, and of blob scan results
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # The daemon scans on a thread of its own, so the connection is shared between threads behind a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_etag(self, url):
+        """
+        Get the last ETag seen for a GitHub API URL
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT etag FROM etags WHERE url = ?", (url,)).fetchone()
+
+            return row[0] if row else None
+
+    def set_etag(self, url, etag):
+        """
+        Record the ETag for a GitHub API URL
+        """
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO etags (url, etag) VALUES (?, ?)", (url, etag))
+
+    def get_tips(self, repo):
+        """
+        Get the last scanned tip of every ref in a repository
+        """
+        with self.lock:
+            return dict(self.conn.execute("SELECT ref, tip FROM refs WHERE repo = ?", (repo,)))
+
+    def get_tip(self, repo, ref='HEAD'):
+        """
+        Get the last scanned tip of a single ref
+        """
+        return self.get_tips(repo).get(ref)
+
+    def get_findings(self, repo):
+        """
+        Get every finding recorded for a repository, grouped by commit
+        """
+        with self.lock:
+            suspicious = {}
+
+            for commit_sha, finding in self.conn.execute(
+                    "SELECT commit_sha, finding FROM findings WHERE repo = ? ORDER BY rowid", (repo,)):
+                suspicious.setdefault(commit_sha, []).append(json.loads(finding))
+
+            return suspicious
+
+    def is_partial(self, repo):
+        """
+        Determine whether a repository's history was only partly scanned, e.g. from a shallow clone
+        """
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM partial_scans WHERE repo = ?", (repo,)).fetchone() is not None
+
+    def unscanned_commits(self, shas):
+        """
+        Filter commits down to those no repository has recorded as scanned, keeping their order
+        """
+        with self.lock:
+            shas = list(shas)
+            scanned = set()
+
+            for i in range(0, len(shas), QUERY_BATCH_SIZE):
+                batch = shas[i:i + QUERY_BATCH_SIZE]
+                scanned.update(sha for sha, in self.conn.execute(
+                    "SELECT sha FROM scanned_commits WHERE sha IN ({})".format(', '.join('?' * len(batch))), batch))
+
+            return [sha for sha in shas if sha not in scanned]
+
+    def get_blob(self, sha, config=''):
+        """
+        Get the (line, rule, secret, start) matches recorded for a blob scanned with `config`, None if never scanned
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT matches FROM scanned_blobs WHERE sha = ? AND config = ?", (sha, config)
+            ).fetchone()
+
+            return [tuple(match) for match in json.loads(row[0])] if row else None
+
+    def record_blobs(self, blobs, config=''):
+        """
+        Record the (line, rule, secret, start) matches of many (sha, matches) blobs scanned with `config`
+
+        `config` identifies the rules the blobs were scanned with, so a change
+        of rules scans every blob again instead of reusing stale results.
+        """
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scanned_blobs (sha, config, matches) VALUES (?, ?, ?)",
+                ((sha, config, json.dumps([list(match) for match in matches])) for sha, matches in blobs)
+            )
+
+    def record_scan(self, repo, tips, suspicious, partial=None, commits=None):
+        """
+        Atomically record a scan's findings along with the ref tips it covered
+
+        Tips are only advanced together with the findings, so an interrupted
+        scan is simply repeated on the next run, and replace every previously
+        recorded tip so deleted refs are forgotten. `partial` marks or clears
+        the repository as partially scanned, None leaves it unchanged.
+        `commits` are added to the index of scanned commits shared by every
+        repository.
+        """
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO findings (repo, commit_sha, finding) VALUES (?, ?, ?)",
+                ((repo, commit_sha, json.dumps(dict(finding), sort_keys=True))
+                 for commit_sha, findings in suspicious.items() for finding in findings)
+            )
+            self.conn.execute("DELETE FROM refs WHERE repo = ?", (repo,))
+            self.conn.executemany(
+                "INSERT INTO refs (repo, ref, tip) VALUES (?, ?, ?)",
+                ((repo, ref, tip) for ref, tip in tips.items())
+            )
+
+            if partial:
+                self.conn.execute("INSERT OR REPLACE INTO partial_scans (repo) VALUES (?)", (repo,))
+            elif partial is not None:
+                self.conn.execute("DELETE FROM partial_scans WHERE repo = ?", (repo,))
+
+            if commits:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO scanned_commits (sha) VALUES (?)", ((sha,) for sha in commits)
+                )
+
+    def close(self):
+        """
+        Close the state database
+        """
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,180 @@
+"""
+Unit Tests for the GitHub API client against a local stand-in server
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from client import GitHubClient
+from httpcache import ResponseCache
+from metrics import Metrics
+from ratelimit import RateLimiter
+from test_ratelimit import FakeClock
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    """
+    Serve canned GitHub API responses, counting connections and requests
+    """
+    protocol_version = 'HTTP/1.1'
+
+    connections = 0
+    requests = []
+    failures = {}
+    remaining = None
+
+    etag = 'W/"d554d09b351dddc7f2ac51b4859a44c4"'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        FakeGitHub.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        FakeGitHub.requests.append((self.path, self.headers.get('Authorization')))
+
+        if FakeGitHub.failures.get(self.path, 0) > 0:
+            FakeGitHub.failures[self.path] -= 1
+            status, body = 503, {"message": "Service Unavailable"}
+        elif FakeGitHub.remaining == 0:
+            FakeGitHub.remaining = 60
+            status, body = 403, {"message": "API rate limit exceeded"}
+        elif self.headers.get('If-None-Match') == FakeGitHub.etag:
+            status, body = 304, None
+        else:
+            status, body = 200, {"url": self.path}
+
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('ETag', FakeGitHub.etag)
+
+        if FakeGitHub.remaining is not None:
+            self.send_header('X-RateLimit-Remaining', str(0 if status == 403 else FakeGitHub.remaining))
+            self.send_header('X-RateLimit-Reset', '1060' if status == 403 else '1120')
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class TestClient(unittest.TestCase):
+
+    def setUp(self):
+        FakeGitHub.connections = 0
+        FakeGitHub.requests = []
+        FakeGitHub.failures = {}
+        FakeGitHub.remaining = None
+        FakeGitHub.etag = 'W/"d554d09b351dddc7f2ac51b4859a44c4"'
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGitHub)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        """
+        Test consecutive requests reuse a single connection
+        """
+        client = GitHubClient(token='abc123')
+        self.addCleanup(client.close)
+
+        for page in range(5):
+            resp = client.get('{}/users/dmyerscough/repos?page={}'.format(self.url, page))
+            self.assertEqual(resp.json(), {"url": "/users/dmyerscough/repos?page={}".format(page)})
+
+        self.assertEqual(FakeGitHub.connections, 1)
+        self.assertEqual(FakeGitHub.requests[0], ('/users/dmyerscough/repos?page=0', 'token abc123'))
+
+    def test_retry(self):
+        """
+        Test server errors are retried with backoff
+        """
+        FakeGitHub.failures['/rate_limit'] = 2
+
+        client = GitHubClient(backoff=0)
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.get('{}/rate_limit'.format(self.url)).status_code, 200)
+        self.assertEqual(len(FakeGitHub.requests), 3)
+
+    def test_retry_exhausted(self):
+        """
+        Test the final response is returned once retries are exhausted
+        """
+        FakeGitHub.failures['/rate_limit'] = 5
+
+        client = GitHubClient(retries=1, backoff=0)
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.get('{}/rate_limit'.format(self.url)).status_code, 503)
+
+    def test_rate_limited(self):
+        """
+        Test a request rejected by the rate limit is retried once the window resets
+        """
+        FakeGitHub.remaining = 0
+
+        clock = FakeClock()
+        client = GitHubClient(ratelimit=RateLimiter(clock=clock, sleep=clock.sleep))
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.get('{}/users/dmyerscough/repos'.format(self.url)).status_code, 200)
+        self.assertEqual(clock.sleeps, [60])
+        self.assertEqual(len(FakeGitHub.requests), 2)
+
+    def test_cache(self):
+        """
+        Test a 304 Not Modified is answered from the cache without using the rate limit
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        cache = ResponseCache(os.path.join(directory, 'http-cache.db'))
+        self.addCleanup(cache.close)
+
+        FakeGitHub.remaining = 60
+
+        clock = FakeClock()
+        metrics = Metrics()
+        client = GitHubClient(cache=cache, ratelimit=RateLimiter(clock=clock, sleep=clock.sleep), metrics=metrics)
+        self.addCleanup(client.close)
+
+        url = '{}/users/dmyerscough/repos'.format(self.url)
+
+        resp = client.get(url)
+        self.assertFalse(resp.from_cache)
+
+        resp = client.get(url)
+        self.assertTrue(resp.from_cache)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"url": "/users/dmyerscough/repos"})
+        self.assertEqual(resp.headers['ETag'], FakeGitHub.etag)
+        self.assertEqual(client.ratelimit.budget()['remaining'], 60)
+
+        FakeGitHub.etag = 'W/"5f8e9e7c6b1f0a4e2b1c3d9a7e6f5a4b"'
+
+        self.assertFalse(client.get(url).from_cache)
+        self.assertEqual(cache.get(url).etag, FakeGitHub.etag)
+
+        self.assertEqual(metrics.counters, {'api_requests': 3, 'api_cache_hits': 1})
+        self.assertEqual(metrics.timers['api_request'][0], 3)
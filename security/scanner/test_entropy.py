@@ -0,0 +1,95 @@
+"""
+Unit Tests for entropy based secret detection
+"""
+
+import base64
+import random
+import unittest
+
+from entropy import EntropyDetector
+from rules import Match
+
+
+class TestEntropy(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = EntropyDetector()
+
+    def test_base64_secret(self):
+        """
+        Test a secret access key without any surrounding context is found
+        """
+        self.assertEqual(
+            list(self.detector.finditer('credentials = ("wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY")')),
+            [Match('high-entropy-base64', 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY', 16)]
+        )
+
+    def test_hex_secret(self):
+        """
+        Test a high entropy hex string is found
+        """
+        self.assertEqual(
+            self.detector.search('token: 9f86d081884c7d659a2feaa0c55ad015'),
+            Match('high-entropy-hex', '9f86d081884c7d659a2feaa0c55ad015', 7)
+        )
+
+    def test_object_ids(self):
+        """
+        Test hex shaped exactly like a git SHA-1 or SHA-256 is not reported
+        """
+        self.assertIsNone(self.detector.search(
+            'commit 4b825dc642cb6eb9a060e54bf8d69288fbee4904\n'
+            'sha256 9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08\n'
+        ))
+        self.assertEqual(
+            self.detector.search('token: 4B825DC642CB6EB9A060E54BF8D69288FBEE4904').rule, 'high-entropy-hex'
+        )
+
+    def test_low_entropy(self):
+        """
+        Test ordinary code and repetitive tokens are ignored
+        """
+        self.assertIsNone(self.detector.search(
+            'import os\nfrom src/main/java/com/example/application import Service\n'
+            'padding = "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA"\n'
+            'repeated = "Zm9vYmFyYmF6cXV4Zm9vYmFyYmF6cXV4Zm9vYmFyYmF6cXV4"\n'
+        ))
+
+    def test_sliding_window(self):
+        """
+        Test a secret embedded in a long low entropy token is still found
+        """
+        text = 'A' * 200 + 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY' + 'A' * 200
+
+        self.assertEqual(
+            self.detector.search(text), Match('high-entropy-base64', 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY', 200)
+        )
+
+    def test_long_run(self):
+        """
+        Test only the best window of a long high entropy run is reported, e.g. an inline image
+        """
+        rng = random.Random(42)
+        data = base64.b64encode(bytes(rng.getrandbits(8) for _ in range(30000))).decode('ascii')
+
+        [match] = self.detector.finditer('src="data:image/png;base64,' + data + '"')
+
+        self.assertEqual(len(match.secret), 40)
+        self.assertIn(match.secret, data)
+
+    def test_thresholds(self):
+        """
+        Test thresholds are configurable and can disable a character set
+        """
+        detector = EntropyDetector(base64_threshold=5.5, hex_threshold=None)
+
+        self.assertIsNone(detector.search('wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY 4b825dc642cb6eb9a060e54bf8d69288fbee4904'))
+
+    def test_non_ascii_offsets(self):
+        """
+        Test offsets remain character offsets in the presence of non-ASCII text
+        """
+        text = u'clé = "wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY"'
+        match = self.detector.search(text)
+
+        self.assertEqual(text[match.start:match.start + len(match.secret)], match.secret)
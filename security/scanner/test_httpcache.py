@@ -0,0 +1,63 @@
+"""
+Unit Tests for the on-disk HTTP response cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from httpcache import CachedResponse, ResponseCache
+from test_ratelimit import FakeClock
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'http-cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_persist(self):
+        """
+        Test cached responses are kept between runs
+        """
+        cache = ResponseCache(self.path)
+        self.assertIsNone(cache.get('https://api.github.com/users/dmyerscough/repos'))
+
+        cache.put('https://api.github.com/users/dmyerscough/repos', 'W/"abc"', {'Link': ''}, b'[]')
+        cache.close()
+
+        cache = ResponseCache(self.path)
+        self.addCleanup(cache.close)
+
+        self.assertEqual(
+            cache.get('https://api.github.com/users/dmyerscough/repos'),
+            CachedResponse('W/"abc"', {'Link': ''}, b'[]')
+        )
+
+    def test_evict(self):
+        """
+        Test the least recently used responses are evicted once over the size limit
+        """
+        clock = FakeClock()
+        cache = ResponseCache(self.path, max_bytes=10, clock=clock)
+        self.addCleanup(cache.close)
+
+        for url in ('/a', '/b', '/c'):
+            clock.sleep(1)
+            cache.put(url, 'W/"abc"', {}, b'1234')
+
+        self.assertEqual(cache.size(), 8)
+        self.assertIsNone(cache.get('/a'))
+
+        clock.sleep(1)
+        cache.get('/b')
+
+        clock.sleep(1)
+        cache.put('/d', 'W/"abc"', {}, b'1234')
+
+        self.assertIsNone(cache.get('/c'))
+        self.assertIsNotNone(cache.get('/b'))
@@ -0,0 +1,106 @@
+"""
+Unit Tests for the scan metrics
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from metrics import Metrics, profiled
+from test_ratelimit import FakeClock
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = Metrics(clock=self.clock)
+
+    def test_counters_and_timers(self):
+        """
+        Test counters add up and timers accumulate runs and seconds
+        """
+        self.metrics.increment('commits_scanned')
+        self.metrics.increment('commits_scanned', 4)
+
+        with self.metrics.timer('clone'):
+            self.clock.sleep(2.5)
+
+        self.metrics.observe('clone', 1.5)
+        self.metrics.gauge('ratelimit_remaining', 42)
+
+        self.assertEqual(self.metrics.snapshot(), {
+            'counters': {'commits_scanned': 5},
+            'timers': {'clone': {'count': 2, 'seconds': 4.0}},
+            'gauges': {'ratelimit_remaining': 42},
+        })
+
+    def test_merge(self):
+        """
+        Test a worker's snapshot is added to the metrics
+        """
+        worker = Metrics()
+        worker.increment('commits_scanned', 3)
+        worker.observe('match', 0.5)
+
+        self.metrics.increment('commits_scanned', 2)
+        self.metrics.merge(worker.snapshot())
+        self.metrics.merge(json.loads(json.dumps(worker.snapshot())))
+
+        self.assertEqual(self.metrics.counters, {'commits_scanned': 8})
+        self.assertEqual(self.metrics.timers, {'match': (2, 1.0)})
+
+    def test_prometheus(self):
+        """
+        Test metrics are rendered in the Prometheus text format
+        """
+        self.metrics.increment('api_requests', 7)
+        self.metrics.observe('clone', 2.0)
+        self.metrics.gauge('ratelimit_remaining', 53)
+        self.metrics.gauge('ratelimit_reset', None)
+
+        self.assertEqual(self.metrics.to_prometheus(), (
+            '# TYPE scanner_api_requests_total counter\n'
+            'scanner_api_requests_total 7\n'
+            '# TYPE scanner_clone_seconds summary\n'
+            'scanner_clone_seconds_sum 2.0\n'
+            'scanner_clone_seconds_count 1\n'
+            '# TYPE scanner_ratelimit_remaining gauge\n'
+            'scanner_ratelimit_remaining 53\n'
+        ))
+
+    def test_write(self):
+        """
+        Test metrics files are replaced in either format
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        self.metrics.increment('findings', 2)
+
+        self.metrics.write(os.path.join(directory, 'scanner.json'))
+        self.metrics.write(os.path.join(directory, 'scanner.prom'), format='prometheus')
+        self.metrics.write(os.path.join(directory, 'scanner.prom'), format='prometheus')
+
+        with open(os.path.join(directory, 'scanner.json')) as fh:
+            self.assertEqual(json.load(fh)['counters'], {'findings': 2})
+
+        with open(os.path.join(directory, 'scanner.prom')) as fh:
+            self.assertIn('scanner_findings_total 2\n', fh.read())
+
+        self.assertEqual(sorted(os.listdir(directory)), ['scanner.json', 'scanner.prom'])
+
+    def test_profiled(self):
+        """
+        Test the hot paths of the profiled block are printed
+        """
+        output = io.StringIO()
+
+        with profiled(output, limit=5):
+            sorted(str(i) for i in range(10000))
+
+        self.assertIn('function calls', output.getvalue())
+        self.assertIn('Top 5 allocations', output.getvalue())
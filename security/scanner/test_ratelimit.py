@@ -0,0 +1,114 @@
+"""
+Unit Tests for the rate limit scheduler
+"""
+
+import unittest
+
+from ratelimit import RateLimiter
+
+
+class FakeClock(object):
+    """
+    Clock that only advances when slept on
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(threshold=5, clock=self.clock, sleep=self.clock.sleep)
+
+    def headers(self, remaining, reset, limit=60):
+        return {
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': str(reset),
+        }
+
+    def test_unknown_budget(self):
+        """
+        Test requests proceed immediately before any rate limit headers are seen
+        """
+        for _ in range(10):
+            self.limiter.acquire()
+
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertIsNone(self.limiter.budget()['remaining'])
+
+    def test_tokens_taken(self):
+        """
+        Test each request takes a token and waits only once the budget is exhausted
+        """
+        self.limiter.update(self.headers(remaining=8, reset=1060))
+
+        for _ in range(3):
+            self.limiter.acquire()
+
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(self.limiter.budget()['remaining'], 5)
+
+        self.limiter.acquire()
+
+        self.assertEqual(self.clock.sleeps, [60])
+        self.assertEqual(self.limiter.budget()['sleeps'], 1)
+        self.assertEqual(self.limiter.budget()['slept'], 60)
+
+    def test_in_flight_requests(self):
+        """
+        Test stale responses from the same window don't inflate the budget
+        """
+        self.limiter.update(self.headers(remaining=30, reset=1060))
+        self.limiter.acquire()
+        self.limiter.acquire()
+
+        self.limiter.update(self.headers(remaining=29, reset=1060))
+
+        self.assertEqual(self.limiter.budget()['remaining'], 28)
+
+    def test_refund(self):
+        """
+        Test requests GitHub did not count give their token back
+        """
+        self.limiter.refund()
+        self.assertIsNone(self.limiter.budget()['remaining'])
+
+        self.limiter.update(self.headers(remaining=30, reset=1060))
+        self.limiter.acquire()
+        self.limiter.refund()
+
+        self.assertEqual(self.limiter.budget()['remaining'], 30)
+
+    def test_new_window(self):
+        """
+        Test a new window replaces the budget while older windows are ignored
+        """
+        self.limiter.update(self.headers(remaining=0, reset=1060))
+        self.assertTrue(self.limiter.exhausted())
+
+        self.limiter.update(self.headers(remaining=60, reset=1120))
+        self.assertFalse(self.limiter.exhausted())
+
+        self.limiter.update(self.headers(remaining=0, reset=1060))
+        self.assertEqual(self.limiter.budget(), {
+            "limit": 60, "remaining": 60, "reset": 1120, "sleeps": 0, "slept": 0.0
+        })
+
+    def test_ignores_responses_without_headers(self):
+        """
+        Test responses without rate limit headers leave the budget alone
+        """
+        self.limiter.update({'ETag': 'W/"d554d09b351dddc7f2ac51b4859a44c4"'})
+
+        self.assertIsNone(self.limiter.budget()['remaining'])